@@ -80,4 +80,15 @@ def add_range_options(parser: argparse.ArgumentParser) -> None:
             metavar=('first', 'last'),
             type=int,
             help='Range of VMIDs to modify (inclusive).'
-    )
\ No newline at end of file
+    )
+def add_parallel_options(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        help='VMs worked on at once. Defaults to SPAM_JOBS or 8.'
+    )
+    parser.add_argument(
+        '--node-jobs',
+        type=int,
+        help='VMs worked on at once on a single node. Defaults to SPAM_NODE_JOBS or 4.'
+    )
@@ -5,6 +5,7 @@ from dotenv import load_dotenv
 import os
 from proxmoxer import ProxmoxAPI
 import conf.config as config
+import utils.utils as utils
 # Inspiration from Ansible code structure
 
 class CLI(ABC):
@@ -18,6 +19,12 @@ class CLI(ABC):
         self.proxmox_user = None
         self.proxmox_pass = None
         self.proxmox_realm = None
+        self.resources = None
+        self.resource_ttl = 30.0
+        self.max_jobs = 8
+        self.node_jobs = 4
+        # VMID -> exception for every VM an operation failed on
+        self.failures: dict[int, Exception] = {}
 
 
     @abstractmethod
@@ -29,9 +36,15 @@ class CLI(ABC):
         self.init_parser()
         options = self.parser.parse_args(self.args[1:])
         self.options = self.post_process_args(options)
+        # --jobs and --node-jobs override the environment for subcommands that have them
+        if getattr(self.options, 'jobs', None):
+            self.max_jobs = self.options.jobs
+        if getattr(self.options, 'node_jobs', None):
+            self.node_jobs = self.options.node_jobs
     
     def connect(self):
         self.prox: ProxmoxAPI = ProxmoxAPI(self.promxox_host, user=f'{self.proxmox_user}@{self.proxmox_realm}', password=self.proxmox_pass, verify_ssl=False)
+        self.resources: utils.ResourceIndex = utils.get_index(self.prox, self.resource_ttl)
     
     def load_env(self) -> None:
         load_dotenv()
@@ -41,6 +54,9 @@ class CLI(ABC):
         self.proxmox_realm = os.getenv('PROXMOX_REALM')
         self.default_node = os.getenv('PROXMOX_DEFAULT_NODE')
         self.configpath = os.getenv('CONFIG_PATH')
+        self.resource_ttl = float(os.getenv('RESOURCE_CACHE_TTL', '30'))
+        self.max_jobs = int(os.getenv('SPAM_JOBS', '8'))
+        self.node_jobs = int(os.getenv('SPAM_NODE_JOBS', '4'))
 
     def prep_config(self) -> config.Env:
         if not self.configpath:
@@ -65,14 +81,20 @@ class CLI(ABC):
             args = sys.argv
         cli = cls(args)
         cli.run()
+        if cli.failures:
+            print(f"{len(cli.failures)} VM(s) failed:")
+            for vmid, error in sorted(cli.failures.items()):
+                print(f"VMID {vmid}: {error}")
+            sys.exit(1)
 
-    def get_vm_resource(self, vmid: str) -> dict:
-        vms = self.prox.cluster.resources.get(type="vm")
-        for vm in vms:
-            if str(vm["vmid"]) == vmid:
-                return vm
+    def run_over_range(self, func: callable, first: int, last: int, node: str, *args, **kwargs) -> None:
+        failures = utils.function_over_range_parallel(
+            func, first, last, node, *args, max_workers=self.max_jobs, node_workers=self.node_jobs, **kwargs
+        )
+        self.failures.update(failures)
 
-        raise FileNotFoundError("VMID not found in cluster")
+    def get_vm_resource(self, vmid: str) -> dict:
+        return self.resources.get(vmid)
 
     def get_vm_config(self, vmid: str) -> dict:
         node = self.get_vm_resource(vmid)["node"]
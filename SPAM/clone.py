@@ -1,8 +1,13 @@
 import math
+import os
+from contextlib import nullcontext
+from functools import partial
+from threading import Lock
 
 from cli import CLI
 import arguments.options as options
 import utils.cloudinit as cloudinit
+from utils.checkpoint import Checkpoint
 import utils.utils as utils
 import conf.config as config
 
@@ -15,6 +20,9 @@ class Clone(CLI):
 
         self.clone_args: dict = {}
         self.environment = None
+        # Source VMID -> lock held while cloning from a running VM, which Proxmox locks for the whole clone
+        self.source_locks: dict[str, Lock] = {}
+        self.source_locks_lock = Lock()
 
     def init_parser(self, usage: str = "", desc=None) -> None:
         super().init_parser(
@@ -31,6 +39,7 @@ class Clone(CLI):
             options.add_optional_node_options(self.parser)
         options.add_pool_options(self.parser)
         options.add_target_node_options(self.parser)
+        options.add_parallel_options(self.parser)
         self.parser.add_argument(
             "-f",
             "--full",
@@ -56,6 +65,16 @@ class Clone(CLI):
             const="conf/training.yaml",
             help="Cloning ccdc training",
         )
+        self.parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Print every VM that -e or -c would clone and configure without doing it.",
+        )
+        self.parser.add_argument(
+            "--checkpoint",
+            type=str,
+            help="File recording the finished steps of -e or -c, re-running skips them. Defaults to the config file name with .checkpoint.json.",
+        )
 
     def post_process_args(self, options):
         # do post processing here
@@ -107,27 +126,43 @@ class Clone(CLI):
         return
 
     def _clone_vm(self, vmid: str, display: bool = False, **kwargs) -> None:
-        vms = self.prox.cluster.resources.get(type="vm")
         try:
-            node = self.get_vm_resource(vmid)["node"]
-            task_id = self.prox.nodes(node).qemu(vmid).clone.create(**kwargs)
-            target = node if "target" not in kwargs else kwargs["target"]
-            print(
-                f"Cloning VMID {vmid} in {node} to VMID {kwargs['newid']} in {target}"
-            )
-            utils.block_until_done(self.prox, task_id, node, display=display)
+            self._clone(vmid, display=display, **kwargs)
         except Exception as e:
             print(e)
         return
 
+    def _clone(self, vmid: str, display: bool = False, **kwargs) -> None:
+        node = self.get_vm_resource(vmid)["node"]
+        task_id = self.prox.nodes(node).qemu(vmid).clone.create(**kwargs)
+        target = node if "target" not in kwargs else kwargs["target"]
+        print(
+            f"Cloning VMID {vmid} in {node} to VMID {kwargs['newid']} in {target}"
+        )
+        utils.block_until_done(self.prox, task_id, node, display=display)
+        self.resources.add(kwargs["newid"], target, name=kwargs.get("name"))
+
+    def _source_lock(self, vmid: str):
+        # Templates and stopped VMs only take a shared lock, so any number of clones can read them at once
+        resource = self.get_vm_resource(vmid)
+        if resource.get("template") == 1 or resource.get("status") == "stopped":
+            return nullcontext()
+        with self.source_locks_lock:
+            if vmid not in self.source_locks:
+                self.source_locks[vmid] = Lock()
+            return self.source_locks[vmid]
+
     def _clone_env(self) -> None:
+        plan = []
         for node in self.environment.nodes:
             for box in self.environment.boxes:
-                self._clone_vm(box.id, target=node, **box.config)
-                if box.cloud:
-                    cloudinit.set_cloudinit(
-                        self.prox, node, box.config["newid"], **box.cloud
-                    )
+                clone_args = dict(box.config)
+                newid = clone_args.pop("newid")
+                name = clone_args.pop("name", None)
+                plan.append(
+                    self._plan_step(0, box.id, newid, node, name, clone_args=clone_args, cloud=box.cloud)
+                )
+        self._run_plan(plan)
         return
 
     def _clone_workshop(self) -> None:
@@ -176,8 +211,7 @@ class Clone(CLI):
         router_ip = self.environment.env["router_ip"]
         gw = self.environment.env["gw"]
         bridge = int(self.environment.env["bridge_start"])
-        clone_count = 0
-        if (
+        if not self.options.dry_run and (
             input(
                 f"Cloning {copies} copies of this environment, starting from VMID {vmid} to {vmid + size * copies - 1}.\n\
 Will be using vmbr{bridge} to vmbr{bridge + (math.ceil(copies / len(self.environment.nodes))) - 1} across nodes {', '.join(self.environment.nodes)}\n\
@@ -188,63 +222,147 @@ Y to continue any other key to quit: "
         ):
             return
 
+        plan = []
+        # Boxes that aren't templates yet are cloned once and promoted, all of them in parallel
         template_ids = []
+        configs = {}
         for box in self.environment.boxes:
             resource = self.get_vm_resource(box.id)
-            node = resource["node"]
+            conf = self.get_vm_config(box.id)
             if resource["template"] == 1:
                 template_ids.append(box.id)
+                configs[box.id] = conf
             else:
-                self._clone_vm(
-                    box.id,
-                    newid=vmid,
-                    target=node,
-                    name=resource["name"],
-                    display=True,
+                plan.append(
+                    self._plan_step(0, box.id, vmid, resource["node"], resource["name"], template=True)
                 )
-                try:
-                    self.prox.nodes(node).qemu(vmid).template.post()
-                except Exception as e:
-                    print(e)
+                # The promoted template has the box's config
                 template_ids.append(str(vmid))
+                configs[str(vmid)] = conf
+                vmid += 1
+
+        # Then each copy is cloned, configured and snapshotted on its own. Copy k goes to node
+        # k % nodes on bridge bridge_start + k // nodes
+        nodes = self.environment.nodes
+        for clone_count in range(copies):
+            node = nodes[clone_count % len(nodes)]
+            copy_bridge = bridge + clone_count // len(nodes)
+            for id in template_ids:
+                conf = configs[id]
+                if "net1" in conf:
+                    cloud = {
+                        "ipconfig0": f"ip={router_ip.replace('X', str(clone_count + 1))},gw={gw}",
+                        "net1": f"model=virtio,bridge=vmbr{copy_bridge}",
+                    }
+                else:
+                    model = conf["net0"].split(",")[0].split("=")[0]
+                    cloud = {"net0": f"model={model},bridge=vmbr{copy_bridge}"}
+                plan.append(
+                    self._plan_step(1, id, vmid, node, f"{conf['name']}-{clone_count + 1}", cloud=cloud, snapshot=True)
+                )
                 vmid += 1
+        self._run_plan(plan)
+
+    def _plan_step(self, stage: int, source: str, vmid: int, node: str, name: str, clone_args: dict = None, template: bool = False, cloud: dict = None, snapshot: bool = False) -> dict:
+        # Stages run in order, a step can clone from a VM made by an earlier stage
+        return {
+            "stage": stage,
+            "source": str(source),
+            "vmid": int(vmid),
+            "node": node,
+            "name": name,
+            "clone_args": clone_args or {},
+            "template": template,
+            "cloud": cloud,
+            "snapshot": snapshot,
+        }
+
+    def _step_phases(self, step: dict) -> list:
+        phases = ["clone"]
+        if step["template"]:
+            phases.append("template")
+        if step["cloud"]:
+            phases.append("configure")
+        if step["snapshot"]:
+            phases.append("snapshot")
+        return phases
+
+    def _run_plan(self, plan: list) -> None:
+        vmids = [step["vmid"] for step in plan]
+        duplicates = sorted({vmid for vmid in vmids if vmids.count(vmid) > 1})
+        if duplicates:
+            self.parser.error(f"VMIDs {', '.join(map(str, duplicates))} would be cloned more than once")
+
+        path = self.options.checkpoint or f"{os.path.splitext(self.configpath)[0]}.checkpoint.json"
+        checkpoint = Checkpoint(path, plan)
+        try:
+            checkpoint.load()
+        except ValueError as e:
+            self.parser.error(str(e))
+
+        if self.options.dry_run:
+            self._print_plan(plan, checkpoint)
+            return
+        checkpoint.save()
+
+        failed = set()
+        for stage in sorted({step["stage"] for step in plan}):
+            jobs = {}
+            for step in plan:
+                if step["stage"] != stage:
+                    continue
+                if step["source"].isdigit() and int(step["source"]) in failed:
+                    self.failures[step["vmid"]] = Exception(f"Source VMID {step['source']} failed")
+                    failed.add(step["vmid"])
+                    continue
+                jobs[step["vmid"]] = (step["node"], partial(self._run_step, step, checkpoint))
+            failures = utils.run_parallel(jobs, self.max_jobs, self.node_jobs)
+            self.failures.update(failures)
+            failed.update(failures)
+
+        if self.failures:
+            print(f"Finished steps are recorded in {path}, run the same command again to retry the rest")
+
+    def _run_step(self, step: dict, checkpoint: Checkpoint) -> None:
+        vmid = step["vmid"]
+        node = step["node"]
+        if not checkpoint.is_done(f"{vmid}:clone"):
+            clone_args = dict(step["clone_args"], newid=vmid, target=node)
+            if step["name"]:
+                clone_args["name"] = step["name"]
+            # Only the clone itself needs the source, configuring and snapshotting can overlap the next clone
+            with self._source_lock(step["source"]):
+                self._clone(step["source"], **clone_args)
+            checkpoint.mark(f"{vmid}:clone")
+        if step["template"] and not checkpoint.is_done(f"{vmid}:template"):
+            self.prox.nodes(node).qemu(vmid).template.post()
+            self.resources.update(vmid, template=1)
+            checkpoint.mark(f"{vmid}:template")
+        if step["cloud"] and not checkpoint.is_done(f"{vmid}:configure"):
+            cloudinit.set_cloudinit(self.prox, node, vmid, **step["cloud"])
+            checkpoint.mark(f"{vmid}:configure")
+        if step["snapshot"] and not checkpoint.is_done(f"{vmid}:snapshot"):
+            task_id = self.prox.nodes(node).qemu(vmid).snapshot.post(
+                snapname="base", vmstate=0
+            )
+            utils.block_until_done(self.prox, task_id, node)
+            checkpoint.mark(f"{vmid}:snapshot")
 
-        while clone_count < copies:
-            for node in self.environment.nodes:
-                for id in template_ids:
-                    conf = self.get_vm_config(id)
-                    self._clone_vm(
-                        id,
-                        newid=vmid,
-                        target=node,
-                        name=f"{conf['name']}-{clone_count + 1}",
-                    )
-                    if "net1" in conf:
-                        cloudinit.set_cloudinit(
-                            self.prox,
-                            node,
-                            vmid,
-                            ipconfig0=f"ip={router_ip.replace('X', str(clone_count + 1))},gw={gw}",
-                            net1=f"model=virtio,bridge=vmbr{bridge}",
-                        )
-                    else:
-                        net = self.get_vm_config(str(vmid))["net0"]
-                        model = net.split(",")[0].split("=")[0]
-
-                        cloudinit.set_cloudinit(
-                            self.prox,
-                            node,
-                            vmid,
-                            net0=f"model={model},bridge=vmbr{bridge}",
-                        )
-                    self.prox.nodes(node).qemu(vmid).snapshot.post(
-                        snapname="base", vmstate=0
-                    )
-                    vmid += 1
-                clone_count += 1
-                if clone_count >= copies:
-                    break
-            bridge += 1
+    def _print_plan(self, plan: list, checkpoint: Checkpoint) -> None:
+        for step in plan:
+            actions = [f"clone {step['source']} to {step['node']}"]
+            if step["name"]:
+                actions[0] += f" as {step['name']}"
+            if step["template"]:
+                actions.append("make template")
+            if step["cloud"]:
+                actions.append(f"set {', '.join(f'{key}={value}' for key, value in step['cloud'].items())}")
+            if step["snapshot"]:
+                actions.append("snapshot base")
+            done = [phase for phase in self._step_phases(step) if checkpoint.is_done(f"{step['vmid']}:{phase}")]
+            status = f" (done: {', '.join(done)})" if done else ""
+            print(f"VMID {step['vmid']}: {'; '.join(actions)}{status}")
+        print(f"{len(plan)} VMs, checkpoint {checkpoint.path}")
 
 
 def main(args=None):
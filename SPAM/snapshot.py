@@ -20,6 +20,7 @@ class Snapshot(CLI):
             options.add_optional_node_options(self.parser)
         options.add_vmid_options(self.parser)
         options.add_range_options(self.parser)
+        options.add_parallel_options(self.parser)
         self.parser.add_argument(
             '-n', '--snapname',
             type=str,
@@ -51,9 +52,9 @@ class Snapshot(CLI):
         if not options.vmid and not options.range:
             self.parser.error("The 'vmid' argument are required unless -r is set.")
         if options.rollback:
-            include: set[str] = {'start', 'snapname', 'vmid'}
+            include: set[str] = {'start', 'snapname'}
         else:
-            include: set[str] = {'vmstate', 'snapname', 'vmid'}
+            include: set[str] = {'vmstate', 'snapname'}
         self.snapshot_args: dict[str,str] = {key: (1 if value is True else 0 if value is False else value) for key, value in vars(options).items() if value is not None and key in include}
 
         return options
@@ -66,32 +67,27 @@ class Snapshot(CLI):
             func = self._make_snapshot
         
         if self.options.vmid:
-            func(self.options.node, **self.snapshot_args)
+            first, last = self.options.vmid, self.options.vmid
         else:
-            utils.function_over_range(func, self.options.range[0], self.options.range[1], self.options.node, **self.snapshot_args)
+            first, last = self.options.range
+        self.run_over_range(func, first, last, self.options.node, **self.snapshot_args)
 
         return
     
     def _rollback_snapshot(self, node: str, snapname: str = "", vmid: int = -1, **kwargs) -> None:
-        try:
-            if snapname == "":
-                snapshots = self.prox.nodes(node).qemu(vmid).snapshot.get()
-                snapname = snapshots[0]["name"]
-            task_id = self.prox.nodes(node).qemu(vmid).snapshot(snapname).rollback.post(**kwargs)
-            utils.block_until_done(self.prox, task_id, node)
-            print(f"Rolling back VMID {vmid} in {node} to {snapname} snapshot.")
-        except Exception as e:
-            print(e)
+        if snapname == "":
+            snapshots = self.prox.nodes(node).qemu(vmid).snapshot.get()
+            snapname = snapshots[0]["name"]
+        task_id = self.prox.nodes(node).qemu(vmid).snapshot(snapname).rollback.post(**kwargs)
+        utils.block_until_done(self.prox, task_id, node)
+        print(f"Rolling back VMID {vmid} in {node} to {snapname} snapshot.")
         return
 
 
     def _make_snapshot(self, node: str, snapname: str = "base", vmid: int = -1, **kwargs):
-        try:
-            task_id = self.prox.nodes(node).qemu(vmid).snapshot.post(snapname=snapname,**kwargs)
-            utils.block_until_done(self.prox, task_id, node)
-            print(f"Snapshotting VMID {vmid} in {node} as {snapname} snapshot.")
-        except Exception as e:
-            print(e)
+        task_id = self.prox.nodes(node).qemu(vmid).snapshot.post(snapname=snapname,**kwargs)
+        utils.block_until_done(self.prox, task_id, node)
+        print(f"Snapshotting VMID {vmid} in {node} as {snapname} snapshot.")
         return
    
 
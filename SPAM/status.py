@@ -21,6 +21,7 @@ class Status(CLI):
             options.add_optional_node_options(self.parser)
         options.add_vmid_options(self.parser)
         options.add_range_options(self.parser)
+        options.add_parallel_options(self.parser)
         self.parser.add_argument(
             "-p", "--stop", action="store_true", help="Stop the VMs"
         )
@@ -33,7 +34,7 @@ class Status(CLI):
         self.parser.add_argument(
             "--revert",
             action="store_true",
-            help="Revert VMs to their most recent snapshot.",
+            help="Revert VMs to their most recent snapshot. Combine with -s to start each VM as soon as it is reverted.",
         )
         self.parser.add_argument(
             "-c",
@@ -67,7 +68,9 @@ class Status(CLI):
 
     def run(self) -> None:
         super().run()
-        if self.options.start:
+        if self.options.revert and self.options.start:
+            func = self._revert_and_start_vm
+        elif self.options.start:
             func = self._start_vm
         elif self.options.stop:
             func = self._stop_vm
@@ -77,11 +80,12 @@ class Status(CLI):
             func = self._revert_vm
 
         if self.options.vmid:
-            func(self.options.node, **self.snapshot_args)
+            self.run_over_range(func, self.options.vmid, self.options.vmid, self.options.node)
         elif self.options.crossnode:
             self._apply_crossnode(func)
         else:
-            utils.function_over_range(
+            # Every VM goes through its stop, rollback, start or destroy on its own
+            self.run_over_range(
                 func,
                 self.options.range[0],
                 self.options.range[1],
@@ -91,53 +95,56 @@ class Status(CLI):
 
         return
 
+    # The operations below raise on failure so ranges can report every VM that failed
+
     def _start_vm(self, node: str, vmid: int = -1) -> None:
         try:
             task_id = self.prox.nodes(node).qemu(vmid).status.start.post()
             utils.block_until_done(self.prox, task_id, node)
-            print(f"Starting VMID {vmid} in {node}")
         except Exception as e:
-            print(e)
+            # Rolling back to a snapshot with RAM leaves the VM running, Proxmox accepts the
+            # start and then fails its task with "VM n already running"
+            if "already running" not in str(e):
+                raise
+        self.resources.update(vmid, status="running")
+        print(f"Starting VMID {vmid} in {node}")
         return
 
     def _stop_vm(self, node: str, vmid: int = -1) -> None:
-        try:
-            task_id = self.prox.nodes(node).qemu(vmid).status.stop.post()
-            utils.block_until_done(self.prox, task_id, node)
-            print(f"Stopping VMID {vmid} in {node}")
-        except Exception as e:
-            print(e)
+        task_id = self.prox.nodes(node).qemu(vmid).status.stop.post()
+        utils.block_until_done(self.prox, task_id, node)
+        self.resources.update(vmid, status="stopped")
+        print(f"Stopping VMID {vmid} in {node}")
 
     def _destroy_vm(self, node: str, vmid: int = -1) -> None:
         args = {
             "destroy-unreferenced-disks": 1,
             "purge": 1,
         }
-        try:
-            self._stop_vm(node, vmid)
-            task_id = self.prox.nodes(node).qemu(vmid).delete(**args)
-            utils.block_until_done(self.prox, task_id, node)
-            print(f"Destroying VMID {vmid} in {node}")
-        except Exception as e:
-            print(e)
+        self._stop_vm(node, vmid)
+        task_id = self.prox.nodes(node).qemu(vmid).delete(**args)
+        utils.block_until_done(self.prox, task_id, node)
+        self.resources.remove(vmid)
+        print(f"Destroying VMID {vmid} in {node}")
 
     def _revert_vm(self, node: str, vmid: int = -1) -> None:
-        try:
-            self._stop_vm(node, vmid)
-            snaps = self.prox.nodes(node).qemu(vmid).snapshot.get()
-            name = None
-            for snap in snaps:
-                if "parent" not in snap and "name" in snap:
-                    name = snap["name"]
+        self._stop_vm(node, vmid)
+        snaps = self.prox.nodes(node).qemu(vmid).snapshot.get()
+        name = None
+        for snap in snaps:
+            if "parent" not in snap and "name" in snap:
+                name = snap["name"]
 
-            if name is None:
-                raise Exception("No snapshot found with no parent")
+        if name is None:
+            raise Exception("No snapshot found with no parent")
 
-            task_id = self.prox.nodes(node).qemu(vmid).snapshot(name).rollback.post()
-            utils.block_until_done(self.prox, task_id, node)
-            print(f"Reverting VMID {vmid} to snapshot {name} in {node}")
-        except Exception as e:
-            print(e)
+        task_id = self.prox.nodes(node).qemu(vmid).snapshot(name).rollback.post()
+        utils.block_until_done(self.prox, task_id, node)
+        print(f"Reverting VMID {vmid} to snapshot {name} in {node}")
+
+    def _revert_and_start_vm(self, node: str, vmid: int = -1) -> None:
+        self._revert_vm(node, vmid)
+        self._start_vm(node, vmid)
 
     def _apply_crossnode(self, func) -> None:
         copies = int(self.environment.env["copies"])
@@ -155,7 +162,10 @@ class Status(CLI):
         while current < copies:
             for node in self.environment.nodes:
                 for _ in template_ids:
-                    func(node, vmid)
+                    try:
+                        func(node, vmid)
+                    except Exception as e:
+                        self.failures[vmid] = e
                     vmid += 1
                 current += 1
                 if current >= copies:
@@ -0,0 +1,38 @@
+import json
+import os
+from threading import Lock
+
+
+class Checkpoint:
+    # Keeps a plan and the steps of it that are done in one JSON file,
+    # so a re-run of the same plan only does what is left
+    def __init__(self, path: str, plan: list) -> None:
+        self.path = path
+        self.plan = plan
+        self.done: set[str] = set()
+        self.lock = Lock()
+
+    def load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r') as file:
+            data = json.load(file)
+        if data["plan"] != self.plan:
+            raise ValueError(f"{self.path} was written for a different plan, delete it to start over")
+        self.done = set(data["done"])
+
+    def is_done(self, step: str) -> bool:
+        with self.lock:
+            return step in self.done
+
+    def mark(self, step: str) -> None:
+        with self.lock:
+            self.done.add(step)
+            self.save()
+
+    def save(self) -> None:
+        # Written to a temporary file first so a crash never leaves half a checkpoint
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w') as file:
+            json.dump({"plan": self.plan, "done": sorted(self.done)}, file, indent=2)
+        os.replace(tmp, self.path)
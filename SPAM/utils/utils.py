@@ -1,10 +1,194 @@
+import os
 from proxmoxer import ProxmoxAPI
-from time import sleep
+from time import sleep, monotonic
+from functools import partial
+from threading import BoundedSemaphore, Lock, Thread
+from concurrent.futures import Future, ThreadPoolExecutor
 
-def block_until_done(prox: ProxmoxAPI, task_id: str, node: str, display: bool = False) -> None:
+class TaskWaiter:
+    # Waits on any number of tasks across nodes, listing each node's active tasks once per tick
+    # instead of polling every task on its own
+    def __init__(self, prox: ProxmoxAPI, min_interval: float = 0.1, max_interval: float = 2.0, max_errors: int = 5) -> None:
+        self.prox = prox
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        # Failed task listings in a row after which a node's tasks fail with the error
+        self.max_errors = max_errors
+        self.errors: dict[str, int] = {}
+        # upid -> (node, time added, deadline or None, future)
+        self.pending: dict[str, tuple] = {}
+        self.lock = Lock()
+        self.thread = None
+
+    def add(self, task_id: str, node: str = None, callback: callable = None, timeout: float = None) -> Future:
+        # A UPID looks like UPID:<node>:..., so the node is optional
+        if node is None:
+            node = task_id.split(":")[1]
+        future = Future()
+        if callback:
+            future.add_done_callback(callback)
+        deadline = monotonic() + timeout if timeout is not None else None
+        with self.lock:
+            self.pending[task_id] = (node, monotonic(), deadline, future)
+            if self.thread is None:
+                self.thread = Thread(target=self._run, daemon=True)
+                self.thread.start()
+        return future
+
+    def wait(self, task_ids: list, node: str = None, timeout: float = None) -> list:
+        futures = [self.add(task_id, node, timeout=timeout) for task_id in task_ids]
+        return [future.result() for future in futures]
+
+    def _finish(self, task_id: str, data: dict = None, error: Exception = None) -> None:
+        with self.lock:
+            entry = self.pending.pop(task_id, None)
+        if entry is None:
+            return
+        if error is not None:
+            entry[3].set_exception(error)
+        else:
+            entry[3].set_result(data)
+
+    def _run(self) -> None:
+        while True:
+            with self.lock:
+                if not self.pending:
+                    self.thread = None
+                    return
+                now = monotonic()
+                by_node: dict[str, list] = {}
+                expired = []
+                for task_id, (node, _, deadline, _) in self.pending.items():
+                    if deadline is not None and now > deadline:
+                        expired.append(task_id)
+                    else:
+                        by_node.setdefault(node, []).append(task_id)
+                youngest = now - max(added for _, added, _, _ in self.pending.values())
+
+            for task_id in expired:
+                self._finish(task_id, error=TimeoutError(f"Timed out waiting for task {task_id}"))
+
+            for node, task_ids in by_node.items():
+                self._poll_node(node, task_ids)
+
+            # New tasks are checked often, long running ones less and less
+            sleep(min(self.max_interval, max(self.min_interval, youngest / 10)))
+
+    def _poll_node(self, node: str, task_ids: list) -> None:
+        try:
+            active = {task["upid"] for task in self.prox.nodes(node).tasks.get(source="active")}
+        except Exception as e:
+            # A passing hiccup is retried, an error that keeps coming back (expired login, wrong node) is raised
+            self.errors[node] = self.errors.get(node, 0) + 1
+            if self.errors[node] < self.max_errors:
+                print(e)
+                return
+            self.errors[node] = 0
+            for task_id in task_ids:
+                self._finish(task_id, error=e)
+            return
+        self.errors[node] = 0
+
+        for task_id in task_ids:
+            if task_id in active:
+                continue
+            # Only tasks that left the active list cost a request of their own
+            try:
+                data = self.prox.nodes(node).tasks(task_id).status.get()
+                if data["status"] != "stopped":
+                    continue
+            except Exception as e:
+                self._finish(task_id, error=e)
+                continue
+            self._finish(task_id, data)
+
+_waiters: dict[int, TaskWaiter] = {}
+_shared_lock = Lock()
+
+def get_waiter(prox: ProxmoxAPI) -> TaskWaiter:
+    # One waiter per connection so concurrent callers share the polling
+    with _shared_lock:
+        if id(prox) not in _waiters:
+            _waiters[id(prox)] = TaskWaiter(prox)
+        return _waiters[id(prox)]
+
+class ResourceIndex:
+    # VMID -> cluster resource (node, template, name, status) built from one cluster query
+    # and downloaded again once it is older than ttl seconds
+    def __init__(self, prox: ProxmoxAPI, ttl: float = 30.0) -> None:
+        self.prox = prox
+        self.ttl = ttl
+        self.vms: dict[int, dict] = {}
+        self.loaded_at = None
+        self.lock = Lock()
+
+    def refresh(self) -> dict[int, dict]:
+        vms = {int(vm["vmid"]): vm for vm in self.prox.cluster.resources.get(type="vm")}
+        with self.lock:
+            self.vms = vms
+            self.loaded_at = monotonic()
+        return vms
+
+    def get(self, vmid) -> dict:
+        vmid = int(vmid)
+        with self.lock:
+            stale = self.loaded_at is None or monotonic() - self.loaded_at > self.ttl
+            vm = self.vms.get(vmid)
+        # A miss may be a VM created outside of SPAM since the last download
+        if stale or vm is None:
+            vm = self.refresh().get(vmid)
+        if vm is None:
+            raise FileNotFoundError("VMID not found in cluster")
+        return vm
+
+    def add(self, vmid, node: str, name: str = None, template: int = 0, status: str = "stopped") -> None:
+        with self.lock:
+            self.vms[int(vmid)] = {
+                "vmid": int(vmid),
+                "type": "qemu",
+                "node": node,
+                "name": name,
+                "template": template,
+                "status": status,
+            }
+
+    def update(self, vmid, **fields) -> None:
+        with self.lock:
+            if int(vmid) in self.vms:
+                self.vms[int(vmid)].update(fields)
+
+    def remove(self, vmid) -> None:
+        with self.lock:
+            self.vms.pop(int(vmid), None)
+
+_indexes: dict[int, ResourceIndex] = {}
+
+def get_index(prox: ProxmoxAPI, ttl: float = 30.0) -> ResourceIndex:
+    # One index per connection so every subcommand sharing it sees the same VMs
+    with _shared_lock:
+        if id(prox) not in _indexes:
+            _indexes[id(prox)] = ResourceIndex(prox, ttl)
+        return _indexes[id(prox)]
+
+def check_exit_status(task_id: str, data: dict) -> None:
+    # Proxmox reports "OK", "WARNINGS: n" or the error itself
+    exitstatus = data.get("exitstatus", "")
+    if exitstatus != "OK" and not exitstatus.startswith("WARNINGS"):
+        raise Exception(f"Task {task_id} failed: {exitstatus}")
+
+def block_until_done(prox: ProxmoxAPI, task_id: str, node: str, display: bool = False, timeout: float = None) -> None:
+    # SPAM_TASK_TIMEOUT (seconds, 0 for none) bounds every wait that doesn't pass its own timeout
+    if timeout is None:
+        timeout = float(os.getenv("SPAM_TASK_TIMEOUT", "3600")) or None
+    if not display:
+        check_exit_status(task_id, get_waiter(prox).add(task_id, node, timeout=timeout).result())
+        return
     start = 0
+    deadline = monotonic() + timeout if timeout is not None else None
     data = {"status": ""}
     while (data["status"] != "stopped"):
+        if deadline is not None and monotonic() > deadline:
+            raise TimeoutError(f"Timed out waiting for task {task_id}")
         data = prox.nodes(node).tasks(task_id).status.get()
         if display:
             log = prox.nodes(node).tasks(task_id).log.get(start=start)
@@ -12,9 +196,41 @@ def block_until_done(prox: ProxmoxAPI, task_id: str, node: str, display: bool =
                 print(line['t'])
             start += len(log)
         sleep(0.1)
+    check_exit_status(task_id, data)
     return
 
 def function_over_range(func: callable, first: int, last: int, *args, **kwargs):
     for vmid in range(first, last + 1):
         func(*args, **kwargs, vmid=vmid)
     return
+
+_node_limits: dict[tuple, BoundedSemaphore] = {}
+
+def get_node_limit(node: str, workers: int) -> BoundedSemaphore:
+    # Shared by every range running in this process, the node's task workers and storage locks are the real limit
+    with _shared_lock:
+        if (node, workers) not in _node_limits:
+            _node_limits[(node, workers)] = BoundedSemaphore(workers)
+        return _node_limits[(node, workers)]
+
+def run_parallel(jobs: dict, max_workers: int = 8, node_workers: int = 4) -> dict:
+    # jobs maps a key (usually a VMID) to (node, func). At most max_workers funcs run at once
+    # and node_workers on any one node. Returns the keys that failed with their exceptions
+    def run(node: str, func: callable) -> None:
+        with get_node_limit(node, node_workers):
+            func()
+
+    failures = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(jobs)))) as executor:
+        futures = {key: executor.submit(run, node, func) for key, (node, func) in jobs.items()}
+        for key, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                failures[key] = e
+    return failures
+
+def function_over_range_parallel(func: callable, first: int, last: int, node: str, *args, max_workers: int = 8, node_workers: int = 4, **kwargs) -> dict:
+    # Runs func(node, ..., vmid=vmid) for the whole range within the limits of run_parallel
+    jobs = {vmid: (node, partial(func, node, *args, **kwargs, vmid=vmid)) for vmid in range(first, last + 1)}
+    return run_parallel(jobs, max_workers, node_workers)
@@ -10,6 +10,15 @@ from dotenv import load_dotenv
 
 import sys
 import pathlib
+import sqlite3
+import threading
+import time
+import heapq
+import itertools
+import bisect
+from collections import OrderedDict
+import functools
+from aiohttp import web
 
 load_dotenv()
 
@@ -19,17 +28,128 @@ intents = discord.Intents.default()
 intents.message_content = True
 intents.dm_messages = True
 
-bot = commands.Bot(command_prefix="!", intents=intents)
+class TeamBot(commands.Bot):
+    async def setup_hook(self):
+        # Runs once per process, unlike on_ready which fires again on reconnect
+        # Join buttons carry their state in the custom_id, so one handler serves every message
+        self.add_dynamic_items(JoinTeamSelect, JoinPageButton, JoinApproveButton, JoinDenyButton)
+        dm_channels.load()
+        outbound.start()
+        # Anything queued before the last shutdown is delivered now
+        outbox.load()
+        outbox.start()
+        reset_jobs.load()
+        reset_jobs.start()
+        warm_pool.start()
+        await metrics.start_server()
+    
+    async def close(self):
+        # Make sure queued writes reach disk before shutting down
+        await admin_digest.flush_all()
+        await persistence.flush()
+        await super().close()
+
+bot = TeamBot(command_prefix="!", intents=intents)
 
 # Base directory for all bot data
 DATA_DIR = pathlib.Path("bot_data")
 
+# Number of journal events kept before they are folded into teams.json
+JOURNAL_COMPACT_THRESHOLD = 200
+
+# Seconds between background flushes of dirty guild data
+FLUSH_INTERVAL_SECONDS = float(os.getenv("FLUSH_INTERVAL_SECONDS", "2"))
+
+# Guild managers kept in memory, and how long one without teams may sit unused before eviction
+GUILD_CACHE_SIZE = int(os.getenv("GUILD_CACHE_SIZE", "100"))
+GUILD_IDLE_MINUTES = float(os.getenv("GUILD_IDLE_MINUTES", "30"))
+
+# Window in which team changes are collapsed into one edit of each timer message
+TIMER_REFRESH_SECONDS = float(os.getenv("TIMER_REFRESH_SECONDS", "5"))
+# Minimum spacing between edits in the same DM channel, and edits in flight at once
+TIMER_EDIT_SPACING_SECONDS = 1.0
+TIMER_EDIT_CONCURRENCY = 5
+
+# DMs in flight at once, and retries after a 429 or 5xx
+DM_CONCURRENCY = int(os.getenv("DM_CONCURRENCY", "8"))
+DM_MAX_RETRIES = 3
+
+# Outbound priority lanes, lower goes first
+LANE_INTERACTION = 0
+LANE_JOIN_REQUEST = 1
+LANE_TEAM = 2
+LANE_ADMIN = 3
+LANE_NAMES = {
+    LANE_INTERACTION: "interaction",
+    LANE_JOIN_REQUEST: "join_request",
+    LANE_TEAM: "team",
+    LANE_ADMIN: "admin"
+}
+# Queued outbound requests above which admin notifications are shed
+OUTBOUND_QUEUE_LIMIT = int(os.getenv("OUTBOUND_QUEUE_LIMIT", "500"))
+
+# Notifications delivered per outbox batch, attempts before one is dropped,
+# and how long delivered keys are remembered so a replayed notification isn't sent twice
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_DONE_RETENTION_HOURS = 24
+
+# Teams listed per page of /join_team, at most 25 fit in a select menu
+JOIN_PAGE_SIZE = 10
+
+# Window over which routine admin notifications are collected into one digest DM
+ADMIN_DIGEST_SECONDS = float(os.getenv("ADMIN_DIGEST_SECONDS", "120"))
+# Digest sections, in the order they are shown
+DIGEST_SECTIONS = {
+    "more_teams": "More Teams Requested By",
+    "formed": "Formed From Queue",
+    "halfway": "Reached Halfway",
+    "ended": "Ended"
+}
+
+# Local Prometheus endpoint, a port of 0 turns it off
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+# Upper bounds in seconds of the latency histogram buckets
+METRIC_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# SPAM checkout used for VM resets; it is imported in-process unless SPAM_IN_PROCESS=0
+SPAM_DIR = pathlib.Path(__file__).resolve().parent / "SPAM"
+SPAM_IN_PROCESS = os.getenv("SPAM_IN_PROCESS", "1") != "0"
+# VM reset workers across all guilds; SPAM's own SPAM_NODE_JOBS limit keeps any one node from being swamped
+PROXMOX_CONCURRENCY = int(os.getenv("PROXMOX_CONCURRENCY", "4"))
+# How often a free slot's VMs are checked while it warms up, and when to give up on the guest agent
+WARM_POLL_SECONDS = float(os.getenv("WARM_POLL_SECONDS", "15"))
+WARM_TIMEOUT_SECONDS = float(os.getenv("WARM_TIMEOUT_SECONDS", "600"))
+# Attempts per reset job, the delay before the first retry (doubling after that),
+# and how many finished jobs are kept for /reset_queue
+RESET_MAX_ATTEMPTS = 3
+RESET_RETRY_SECONDS = 30
+RESET_HISTORY_SIZE = 25
+# Slot readiness, best first; the allocator hands out the best free slot
+WARM_STATES = ("ready", "started", "unknown", "stopped")
+
+# Seconds /queue waits for more users before forming teams, so a burst lands in one pass
+MATCHMAKING_WINDOW_SECONDS = float(os.getenv("MATCHMAKING_WINDOW_SECONDS", "3"))
+# Journal events that may let queued users be placed
+MATCHMAKING_TRIGGERS = {"slot_freed", "slot_reopened", "teams_reset", "member_left", "auto_accept_changed"}
+
 def get_guild_data_dir(guild_id: int) -> pathlib.Path:
     """Get the data directory for a specific guild"""
     guild_dir = DATA_DIR / str(guild_id)
     guild_dir.mkdir(parents=True, exist_ok=True)
     return guild_dir
 
+def write_json_atomic(path: pathlib.Path, data):
+    """Write JSON through a temp file and rename so a crash never leaves a truncated file"""
+    # Per-thread temp name, so two writers of the same file never replace each other's temp file
+    tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
 class TeamSettings:
     def __init__(self):
         self.max_team_size = 0
@@ -42,6 +162,10 @@ class TeamSettings:
     def get_ip(self, team_num: int) -> str:
         return self.ip_base.replace("x", str(team_num))
     
+    def get_vmid_range(self, team_num: int) -> tuple:
+        first = self.start_vmid + (team_num - 1) * self.number_of_machines
+        return first, first + self.number_of_machines - 1
+    
     def to_dict(self) -> dict:
         return {
             "max_team_size": self.max_team_size,
@@ -74,6 +198,8 @@ class Team:
         self.is_active = True
         self.timer_message_ids: Dict[int, tuple] = {}
         self.halfway_notified = False
+        self.auto_accept = False
+        self.last_update = ""
     
     def to_dict(self) -> dict:
         return {
@@ -84,7 +210,8 @@ class Team:
             "end_time": self.end_time.isoformat(),
             "is_active": self.is_active,
             "timer_message_ids": {str(k): v for k, v in self.timer_message_ids.items()},
-            "halfway_notified": self.halfway_notified
+            "halfway_notified": self.halfway_notified,
+            "auto_accept": self.auto_accept
         }
     
     @classmethod
@@ -99,6 +226,8 @@ class Team:
         team.is_active = data["is_active"]
         team.timer_message_ids = {int(k): tuple(v) for k, v in data.get("timer_message_ids", {}).items()}
         team.halfway_notified = data.get("halfway_notified", False)
+        team.auto_accept = data.get("auto_accept", False)
+        team.last_update = ""
         return team
 
 class GuildTeamManager:
@@ -111,6 +240,60 @@ class GuildTeamManager:
         self.available_team_nums: Set[int] = set(range(1, self.settings.max_teams + 1))
         self.admins: Set[int] = set()
         self.closed_teams: Set[int] = set()
+        self.journal_seq = 0
+        self.journal_length = 0
+        self.pending_events: List[dict] = []
+        self.dirty: Set[str] = set()
+        # Teams that can take another member, sorted by team number and by member count
+        self.joinable_by_number: List[int] = []
+        self.joinable_by_space: List[tuple] = []
+        self.joinable_keys: Dict[int, tuple] = {}
+        # Users waiting in /queue, oldest first; not persisted, a restart empties the queue
+        self.queue: OrderedDict = OrderedDict()
+    
+    def allocate_team_num(self) -> Optional[int]:
+        """Take the free slot whose VMs are furthest along warming up, or None if the guild is at its team limit"""
+        if not self.available_team_nums or len(self.teams) >= self.settings.max_teams:
+            return None
+        # A slot whose old VMs are still being reverted (after /reset) isn't ready to hand out
+        candidates = self.available_team_nums - reset_jobs.running_slots(self.guild_id)
+        if not candidates:
+            return None
+        team_num = min(candidates, key=lambda num: (WARM_STATES.index(warm_pool.state(self.guild_id, num)), num))
+        self.available_team_nums.remove(team_num)
+        warm_pool.release(self.guild_id, team_num)
+        return team_num
+    
+    def index_team(self, team_num: int):
+        """Move one team to its current place in the joinable index"""
+        old_key = self.joinable_keys.pop(team_num, None)
+        if old_key is not None:
+            del self.joinable_by_number[bisect.bisect_left(self.joinable_by_number, team_num)]
+            del self.joinable_by_space[bisect.bisect_left(self.joinable_by_space, old_key)]
+        
+        team = self.teams.get(team_num)
+        if team is not None and team.is_active and len(team.members) < self.settings.max_team_size:
+            # Emptiest teams first, ties broken by team number
+            key = (len(team.members), team_num)
+            self.joinable_keys[team_num] = key
+            bisect.insort(self.joinable_by_number, team_num)
+            bisect.insort(self.joinable_by_space, key)
+    
+    def rebuild_joinable(self):
+        self.joinable_by_number = []
+        self.joinable_by_space = []
+        self.joinable_keys = {}
+        for team_num in self.teams:
+            self.index_team(team_num)
+    
+    def joinable_page(self, order: str, page: int, page_size: int) -> tuple:
+        """Team numbers on one page of the joinable index, and the total number of joinable teams"""
+        start = page * page_size
+        if order == "space":
+            team_nums = [team_num for _, team_num in self.joinable_by_space[start:start + page_size]]
+        else:
+            team_nums = self.joinable_by_number[start:start + page_size]
+        return team_nums, len(self.joinable_keys)
     
     def update_max_teams(self, new_max: int):
         old_max = self.settings.max_teams
@@ -119,165 +302,2170 @@ class GuildTeamManager:
         if new_max > old_max:
             for team_num in range(old_max + 1, new_max + 1):
                 self.available_team_nums.add(team_num)
+            warm_pool.warm_guild(self)
         
         self.save_settings()
     
-    def get_settings_file(self) -> pathlib.Path:
-        return get_guild_data_dir(self.guild_id) / "settings.json"
+    def save_settings(self):
+        """Queue settings to be written by the background writer"""
+        # The max team size decides which teams are joinable
+        self.rebuild_joinable()
+        if self.queue:
+            matchmaker.kick(self.guild_id)
+        self.dirty.add("settings")
+        persistence.mark_dirty(self)
     
-    def get_teams_file(self) -> pathlib.Path:
-        return get_guild_data_dir(self.guild_id) / "teams.json"
+    def save_teams(self):
+        """Queue a full snapshot of the teams state"""
+        self.dirty.add("teams")
+        persistence.mark_dirty(self)
     
-    def get_admins_file(self) -> pathlib.Path:
-        return get_guild_data_dir(self.guild_id) / "admins.json"
+    def save_admins(self):
+        """Queue admins to be written by the background writer"""
+        self.dirty.add("admins")
+        persistence.mark_dirty(self)
+    
+    def record_event(self, kind: str, **data):
+        """Queue a single team state change for the storage backend"""
+        self.journal_seq += 1
+        self.pending_events.append({"seq": self.journal_seq, "kind": kind, **data})
+        self.dirty.add("journal")
+        persistence.mark_dirty(self)
+        multi_manager.track_deadlines(self)
+        
+        if kind == "teams_reset":
+            self.rebuild_joinable()
+        elif kind == "team_created":
+            self.index_team(data["team"]["team_num"])
+        elif "team_num" in data:
+            self.index_team(data["team_num"])
+        
+        if self.queue and kind in MATCHMAKING_TRIGGERS:
+            matchmaker.kick(self.guild_id)
     
-    def save_settings(self):
-        """Save settings to JSON file"""
+    def take_pending_writes(self) -> dict:
+        """Capture everything that needs writing; runs on the event loop so the capture is consistent"""
+        dirty, self.dirty = self.dirty, set()
+        events, self.pending_events = self.pending_events, []
+        
+        if "journal" in dirty and storage.needs_compaction(self.journal_length + len(events)):
+            dirty.add("teams")
+        
+        work = {}
+        if "settings" in dirty:
+            work["settings"] = self.settings.to_dict()
+        if "admins" in dirty:
+            work["admins"] = {"admins": list(self.admins)}
+        if "teams" in dirty:
+            # The snapshot already contains every queued event
+            work["teams"] = {
+                "teams": {str(num): team.to_dict() for num, team in self.teams.items()},
+                "user_teams": {str(k): v for k, v in self.user_teams.items()},
+                "available_team_nums": list(self.available_team_nums),
+                "closed_teams": list(self.closed_teams),
+                "journal_seq": self.journal_seq
+            }
+            self.journal_length = 0
+        elif events:
+            work["events"] = events
+            self.journal_length += len(events)
+        return work
+    
+    def write_pending(self, work: dict):
+        """Hand captured data to the storage backend; runs in a worker thread"""
+        storage.write(self.guild_id, work)
+    
+    def restore_pending_writes(self, work: dict):
+        """Mark failed writes dirty again; lost events are recovered by a full snapshot"""
+        for part in ("settings", "admins", "teams"):
+            if part in work:
+                self.dirty.add(part)
+        if "events" in work:
+            self.dirty.add("teams")
+        persistence.mark_dirty(self)
+    
+    def apply_event(self, event: dict):
+        """Apply a journal event to the in-memory state"""
+        kind = event["kind"]
+        
+        if kind == "team_created":
+            team = Team.from_dict(event["team"], self.settings)
+            self.teams[team.team_num] = team
+            for member_id in team.members:
+                self.user_teams[member_id] = team.team_num
+            self.available_team_nums.discard(team.team_num)
+            return
+        
+        if kind == "teams_reset":
+            self.teams.clear()
+            self.user_teams.clear()
+            self.closed_teams.clear()
+            self.available_team_nums = set(range(1, event["max_teams"] + 1))
+            return
+        
+        team_num = event["team_num"]
+        
+        if kind == "slot_freed":
+            self.closed_teams.discard(team_num)
+            self.teams.pop(team_num, None)
+            self.available_team_nums.add(team_num)
+            return
+        
+        if kind == "slot_reopened":
+            self.closed_teams.discard(team_num)
+            self.available_team_nums.add(team_num)
+            if team_num in self.teams and not self.teams[team_num].is_active:
+                del self.teams[team_num]
+            return
+        
+        team = self.teams.get(team_num)
+        if team is None:
+            return
+        
+        if kind == "member_joined":
+            user_id = event["user_id"]
+            team.members[user_id] = event["username"]
+            self.user_teams[user_id] = team_num
+            if event.get("timer_message"):
+                team.timer_message_ids[user_id] = tuple(event["timer_message"])
+        elif kind == "member_left":
+            team.members.pop(event["user_id"], None)
+            team.timer_message_ids.pop(event["user_id"], None)
+            self.user_teams.pop(event["user_id"], None)
+        elif kind == "captain_changed":
+            team.captain_id = event["captain_id"]
+        elif kind == "halfway_notified":
+            team.halfway_notified = True
+        elif kind == "auto_accept_changed":
+            team.auto_accept = event["auto_accept"]
+        elif kind == "team_closed":
+            team.is_active = False
+            self.closed_teams.add(team_num)
+            for member_id in team.members:
+                self.user_teams.pop(member_id, None)
+        else:
+            print(f"[Guild {self.guild_id}] Unknown journal event: {kind}")
+    
+    def load_all(self):
+        """Load all saved data"""
+        storage.load(self)
+        self.rebuild_joinable()
+
+class JsonStorage:
+    """Stores each guild as JSON files plus a journal under bot_data/<guild_id>/"""
+    def get_settings_file(self, guild_id: int) -> pathlib.Path:
+        return get_guild_data_dir(guild_id) / "settings.json"
+    
+    def get_teams_file(self, guild_id: int) -> pathlib.Path:
+        return get_guild_data_dir(guild_id) / "teams.json"
+    
+    def get_admins_file(self, guild_id: int) -> pathlib.Path:
+        return get_guild_data_dir(guild_id) / "admins.json"
+    
+    def get_journal_file(self, guild_id: int) -> pathlib.Path:
+        return get_guild_data_dir(guild_id) / "teams.journal"
+    
+    def needs_compaction(self, journal_length: int) -> bool:
+        return journal_length >= JOURNAL_COMPACT_THRESHOLD
+    
+    def get_deadline_index_file(self) -> pathlib.Path:
+        return DATA_DIR / "deadline_guilds.json"
+    
+    def list_guilds(self) -> List[int]:
+        if not DATA_DIR.exists():
+            return []
+        return [int(guild_dir.name) for guild_dir in DATA_DIR.iterdir() if guild_dir.is_dir() and guild_dir.name.isdigit()]
+    
+    def list_deadline_guilds(self) -> List[int]:
+        """Guilds that had teams at the last flush"""
+        index_file = self.get_deadline_index_file()
+        if index_file.exists():
+            try:
+                with open(index_file, 'r') as f:
+                    return json.load(f).get("guilds", [])
+            except Exception as e:
+                print(f"Error loading deadline index: {e}")
+        # No usable index yet, scan every guild once to build it
+        return self.list_guilds()
+    
+    def write_deadline_index(self, guild_ids: List[int]):
+        DATA_DIR.mkdir(parents=True, exist_ok=True)
+        write_json_atomic(self.get_deadline_index_file(), {"guilds": guild_ids})
+    
+    def get_dm_channels_file(self) -> pathlib.Path:
+        return DATA_DIR / "dm_channels.json"
+    
+    def load_dm_channels(self) -> Dict[int, int]:
+        channels_file = self.get_dm_channels_file()
+        if not channels_file.exists():
+            return {}
         try:
-            with open(self.get_settings_file(), 'w') as f:
-                json.dump(self.settings.to_dict(), f, indent=2)
-            print(f"[Guild {self.guild_id}] Settings saved")
+            with open(channels_file, 'r') as f:
+                return {int(k): v for k, v in json.load(f).items()}
         except Exception as e:
-            print(f"[Guild {self.guild_id}] Error saving settings: {e}")
+            print(f"Error loading DM channels: {e}")
+            return {}
+    
+    def write_dm_channels(self, channels: Dict[int, int]):
+        DATA_DIR.mkdir(parents=True, exist_ok=True)
+        write_json_atomic(self.get_dm_channels_file(), {str(k): v for k, v in channels.items()})
     
-    def load_settings(self):
+    def write(self, guild_id: int, work: dict):
+        if "settings" in work:
+            write_json_atomic(self.get_settings_file(guild_id), work["settings"])
+            print(f"[Guild {guild_id}] Settings saved")
+        
+        if "admins" in work:
+            write_json_atomic(self.get_admins_file(guild_id), work["admins"])
+            print(f"[Guild {guild_id}] Admins saved")
+        
+        if "teams" in work:
+            write_json_atomic(self.get_teams_file(guild_id), work["teams"])
+            # Every event up to journal_seq is now part of the snapshot
+            with open(self.get_journal_file(guild_id), 'w') as f:
+                os.fsync(f.fileno())
+            print(f"[Guild {guild_id}] Teams saved")
+        elif "events" in work:
+            with open(self.get_journal_file(guild_id), 'a') as f:
+                f.write("".join(json.dumps(event) + "\n" for event in work["events"]))
+                f.flush()
+                os.fsync(f.fileno())
+    
+    def load(self, manager: GuildTeamManager):
+        self.load_settings(manager)
+        self.load_admins(manager)
+        self.load_teams(manager)
+    
+    def load_settings(self, manager: GuildTeamManager):
         """Load settings from JSON file"""
         try:
-            settings_file = self.get_settings_file()
+            settings_file = self.get_settings_file(manager.guild_id)
             if settings_file.exists():
                 with open(settings_file, 'r') as f:
                     data = json.load(f)
-                    self.settings = TeamSettings.from_dict(data)
-                    self.available_team_nums = set(range(1, self.settings.max_teams + 1))
-                    print(f"[Guild {self.guild_id}] Settings loaded")
+                    manager.settings = TeamSettings.from_dict(data)
+                    manager.available_team_nums = set(range(1, manager.settings.max_teams + 1))
+                    print(f"[Guild {manager.guild_id}] Settings loaded")
                     return True
         except Exception as e:
-            print(f"[Guild {self.guild_id}] Error loading settings: {e}")
+            print(f"[Guild {manager.guild_id}] Error loading settings: {e}")
         return False
     
-    def save_teams(self):
-        """Save teams data to JSON file"""
-        try:
-            data = {
-                "teams": {str(num): team.to_dict() for num, team in self.teams.items()},
-                "user_teams": {str(k): v for k, v in self.user_teams.items()},
-                "available_team_nums": list(self.available_team_nums),
-                "closed_teams": list(self.closed_teams)
-            }
-            with open(self.get_teams_file(), 'w') as f:
-                json.dump(data, f, indent=2)
-            print(f"[Guild {self.guild_id}] Teams saved")
-        except Exception as e:
-            print(f"[Guild {self.guild_id}] Error saving teams: {e}")
-    
-    def load_teams(self):
-        """Load teams data from JSON file"""
+    def load_teams(self, manager: GuildTeamManager):
+        """Load the teams.json snapshot and replay the journal on top of it"""
+        loaded = False
         try:
-            teams_file = self.get_teams_file()
+            teams_file = self.get_teams_file(manager.guild_id)
             if teams_file.exists():
                 with open(teams_file, 'r') as f:
                     data = json.load(f)
                     
                     # Restore teams
-                    self.teams = {}
+                    manager.teams = {}
                     for team_num_str, team_data in data.get("teams", {}).items():
-                        team = Team.from_dict(team_data, self.settings)
-                        self.teams[int(team_num_str)] = team
+                        team = Team.from_dict(team_data, manager.settings)
+                        manager.teams[int(team_num_str)] = team
                     
                     # Restore user_teams mapping
-                    self.user_teams = {int(k): v for k, v in data.get("user_teams", {}).items()}
+                    manager.user_teams = {int(k): v for k, v in data.get("user_teams", {}).items()}
                     
                     # Restore available team numbers
-                    self.available_team_nums = set(data.get("available_team_nums", []))
+                    manager.available_team_nums = set(data.get("available_team_nums", []))
                     
                     # Restore closed teams
-                    self.closed_teams = set(data.get("closed_teams", []))
+                    manager.closed_teams = set(data.get("closed_teams", []))
                     
-                    print(f"[Guild {self.guild_id}] Teams loaded - {len(self.teams)} active teams")
-                    return True
-        except Exception as e:
-            print(f"[Guild {self.guild_id}] Error loading teams: {e}")
-        return False
-    
-    def save_admins(self):
-        """Save admins to JSON file"""
-        try:
-            data = {
-                "admins": list(self.admins)
-            }
-            with open(self.get_admins_file(), 'w') as f:
-                json.dump(data, f, indent=2)
-            print(f"[Guild {self.guild_id}] Admins saved")
+                    manager.journal_seq = data.get("journal_seq", 0)
+                    loaded = True
+            
+            replayed = self.replay_journal(manager)
+            if loaded or replayed:
+                print(f"[Guild {manager.guild_id}] Teams loaded - {len(manager.teams)} active teams ({replayed} journal events replayed)")
+                return True
         except Exception as e:
-            print(f"[Guild {self.guild_id}] Error saving admins: {e}")
+            print(f"[Guild {manager.guild_id}] Error loading teams: {e}")
+        return loaded
+    
+    def replay_journal(self, manager: GuildTeamManager) -> int:
+        """Replay journal events newer than the loaded snapshot"""
+        journal_file = self.get_journal_file(manager.guild_id)
+        if not journal_file.exists():
+            return 0
+        
+        replayed = 0
+        with open(journal_file, 'r') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    # Only the last line can be torn by a crash, nothing after it was written
+                    print(f"[Guild {manager.guild_id}] Skipping corrupt journal line")
+                    break
+                
+                if event["seq"] <= manager.journal_seq:
+                    continue
+                
+                manager.apply_event(event)
+                manager.journal_seq = event["seq"]
+                replayed += 1
+        
+        manager.journal_length = replayed
+        return replayed
     
-    def load_admins(self):
+    def load_admins(self, manager: GuildTeamManager):
         """Load admins from JSON file"""
         try:
-            admins_file = self.get_admins_file()
+            admins_file = self.get_admins_file(manager.guild_id)
             if admins_file.exists():
                 with open(admins_file, 'r') as f:
                     data = json.load(f)
-                    self.admins = set(data.get("admins", []))
-                    print(f"[Guild {self.guild_id}] Admins loaded - {len(self.admins)} admins")
+                    manager.admins = set(data.get("admins", []))
+                    print(f"[Guild {manager.guild_id}] Admins loaded - {len(manager.admins)} admins")
                     return True
         except Exception as e:
-            print(f"[Guild {self.guild_id}] Error loading admins: {e}")
+            print(f"[Guild {manager.guild_id}] Error loading admins: {e}")
+        return False
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS guilds (
+    guild_id INTEGER PRIMARY KEY,
+    settings TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS teams (
+    guild_id INTEGER NOT NULL,
+    team_num INTEGER NOT NULL,
+    captain_id INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    end_time TEXT NOT NULL,
+    is_active INTEGER NOT NULL,
+    halfway_notified INTEGER NOT NULL,
+    auto_accept INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (guild_id, team_num)
+);
+CREATE TABLE IF NOT EXISTS memberships (
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    team_num INTEGER NOT NULL,
+    username TEXT NOT NULL,
+    PRIMARY KEY (guild_id, team_num, user_id)
+);
+CREATE INDEX IF NOT EXISTS memberships_by_user ON memberships (guild_id, user_id);
+CREATE TABLE IF NOT EXISTS timer_messages (
+    guild_id INTEGER NOT NULL,
+    team_num INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, team_num, user_id)
+);
+CREATE TABLE IF NOT EXISTS closed_slots (
+    guild_id INTEGER NOT NULL,
+    team_num INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, team_num)
+);
+CREATE TABLE IF NOT EXISTS available_slots (
+    guild_id INTEGER NOT NULL,
+    team_num INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, team_num)
+);
+CREATE TABLE IF NOT EXISTS admins (
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, user_id)
+);
+CREATE TABLE IF NOT EXISTS dm_channels (
+    user_id INTEGER PRIMARY KEY,
+    channel_id INTEGER NOT NULL
+);
+"""
+
+class SqliteStorage:
+    """Stores all guilds in one SQLite database; each journal event becomes a point update"""
+    TEAM_TABLES = ("teams", "memberships", "timer_messages", "closed_slots", "available_slots")
+    
+    def __init__(self, path: pathlib.Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Writes happen in worker threads, the lock serializes them
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(SQLITE_SCHEMA)
+            # Databases created before teams had an auto-accept flag
+            team_columns = {row[1] for row in self.conn.execute("PRAGMA table_info(teams)")}
+            if "auto_accept" not in team_columns:
+                self.conn.execute("ALTER TABLE teams ADD COLUMN auto_accept INTEGER NOT NULL DEFAULT 0")
+            self.conn.commit()
+        # Loads happen on the event loop, their own connection keeps them from waiting on a
+        # writer's commit since WAL readers see the last committed state without blocking
+        self.read_conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.read_lock = threading.Lock()
+    
+    def needs_compaction(self, journal_length: int) -> bool:
         return False
     
-    def load_all(self):
-        """Load all saved data"""
-        self.load_settings()
-        self.load_admins()
-        self.load_teams()
+    def list_deadline_guilds(self) -> List[int]:
+        with self.read_lock:
+            migrated = {row[0] for row in self.read_conn.execute("SELECT guild_id FROM guilds")}
+            guild_ids = {row[0] for row in self.read_conn.execute("SELECT DISTINCT guild_id FROM teams")}
+        guild_ids.update(guild_id for guild_id in JsonStorage().list_deadline_guilds() if guild_id not in migrated)
+        return sorted(guild_ids)
+    
+    def write_deadline_index(self, guild_ids: List[int]):
+        # The teams table already is the index
+        pass
+    
+    def load_dm_channels(self) -> Dict[int, int]:
+        with self.read_lock:
+            channels = dict(self.read_conn.execute("SELECT user_id, channel_id FROM dm_channels"))
+        if not channels:
+            channels = JsonStorage().load_dm_channels()
+        return channels
+    
+    def write_dm_channels(self, channels: Dict[int, int]):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM dm_channels")
+            self.conn.executemany("INSERT INTO dm_channels (user_id, channel_id) VALUES (?, ?)", channels.items())
+    
+    def write(self, guild_id: int, work: dict):
+        with self.lock, self.conn:
+            settings = work.get("settings", TeamSettings().to_dict())
+            if "settings" in work:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO guilds (guild_id, settings) VALUES (?, ?)",
+                    (guild_id, json.dumps(settings))
+                )
+            else:
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO guilds (guild_id, settings) VALUES (?, ?)",
+                    (guild_id, json.dumps(settings))
+                )
+            
+            if "admins" in work:
+                self.conn.execute("DELETE FROM admins WHERE guild_id = ?", (guild_id,))
+                self.conn.executemany(
+                    "INSERT INTO admins (guild_id, user_id) VALUES (?, ?)",
+                    [(guild_id, admin_id) for admin_id in work["admins"]["admins"]]
+                )
+            
+            if "teams" in work:
+                self.write_snapshot(guild_id, work["teams"])
+            elif "events" in work:
+                for event in work["events"]:
+                    self.write_event(guild_id, event)
+    
+    def insert_team(self, guild_id: int, team_data: dict):
+        team_num = team_data["team_num"]
+        self.conn.execute(
+            "INSERT OR REPLACE INTO teams (guild_id, team_num, captain_id, created_at, end_time, is_active, halfway_notified, auto_accept) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (guild_id, team_num, team_data["captain_id"], team_data["created_at"], team_data["end_time"], int(team_data["is_active"]), int(team_data["halfway_notified"]), int(team_data.get("auto_accept", False)))
+        )
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO memberships (guild_id, user_id, team_num, username) VALUES (?, ?, ?, ?)",
+            [(guild_id, int(user_id), team_num, username) for user_id, username in team_data["members"].items()]
+        )
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO timer_messages (guild_id, team_num, user_id, channel_id, message_id) VALUES (?, ?, ?, ?, ?)",
+            [(guild_id, team_num, int(user_id), ids[0], ids[1]) for user_id, ids in team_data["timer_message_ids"].items()]
+        )
+    
+    def delete_team(self, guild_id: int, team_num: int):
+        for table in ("teams", "memberships", "timer_messages"):
+            self.conn.execute(f"DELETE FROM {table} WHERE guild_id = ? AND team_num = ?", (guild_id, team_num))
+    
+    def write_snapshot(self, guild_id: int, data: dict):
+        for table in self.TEAM_TABLES:
+            self.conn.execute(f"DELETE FROM {table} WHERE guild_id = ?", (guild_id,))
+        for team_data in data["teams"].values():
+            self.insert_team(guild_id, team_data)
+        self.conn.executemany(
+            "INSERT INTO available_slots (guild_id, team_num) VALUES (?, ?)",
+            [(guild_id, team_num) for team_num in data["available_team_nums"]]
+        )
+        self.conn.executemany(
+            "INSERT INTO closed_slots (guild_id, team_num) VALUES (?, ?)",
+            [(guild_id, team_num) for team_num in data["closed_teams"]]
+        )
+    
+    def write_event(self, guild_id: int, event: dict):
+        kind = event["kind"]
+        
+        if kind == "team_created":
+            self.insert_team(guild_id, event["team"])
+            self.conn.execute("DELETE FROM available_slots WHERE guild_id = ? AND team_num = ?", (guild_id, event["team"]["team_num"]))
+        elif kind == "teams_reset":
+            for table in self.TEAM_TABLES:
+                self.conn.execute(f"DELETE FROM {table} WHERE guild_id = ?", (guild_id,))
+            self.conn.executemany(
+                "INSERT INTO available_slots (guild_id, team_num) VALUES (?, ?)",
+                [(guild_id, team_num) for team_num in range(1, event["max_teams"] + 1)]
+            )
+        elif kind == "slot_freed":
+            self.delete_team(guild_id, event["team_num"])
+            self.conn.execute("DELETE FROM closed_slots WHERE guild_id = ? AND team_num = ?", (guild_id, event["team_num"]))
+            self.conn.execute("INSERT OR IGNORE INTO available_slots (guild_id, team_num) VALUES (?, ?)", (guild_id, event["team_num"]))
+        elif kind == "slot_reopened":
+            # Only closed slots can be reopened, so whatever team is left there has ended
+            self.delete_team(guild_id, event["team_num"])
+            self.conn.execute("DELETE FROM closed_slots WHERE guild_id = ? AND team_num = ?", (guild_id, event["team_num"]))
+            self.conn.execute("INSERT OR IGNORE INTO available_slots (guild_id, team_num) VALUES (?, ?)", (guild_id, event["team_num"]))
+        elif kind == "member_joined":
+            self.conn.execute(
+                "INSERT OR REPLACE INTO memberships (guild_id, user_id, team_num, username) VALUES (?, ?, ?, ?)",
+                (guild_id, event["user_id"], event["team_num"], event["username"])
+            )
+            if event.get("timer_message"):
+                channel_id, message_id = event["timer_message"]
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO timer_messages (guild_id, team_num, user_id, channel_id, message_id) VALUES (?, ?, ?, ?, ?)",
+                    (guild_id, event["team_num"], event["user_id"], channel_id, message_id)
+                )
+        elif kind == "member_left":
+            for table in ("memberships", "timer_messages"):
+                self.conn.execute(
+                    f"DELETE FROM {table} WHERE guild_id = ? AND team_num = ? AND user_id = ?",
+                    (guild_id, event["team_num"], event["user_id"])
+                )
+        elif kind == "captain_changed":
+            self.conn.execute(
+                "UPDATE teams SET captain_id = ? WHERE guild_id = ? AND team_num = ?",
+                (event["captain_id"], guild_id, event["team_num"])
+            )
+        elif kind == "halfway_notified":
+            self.conn.execute(
+                "UPDATE teams SET halfway_notified = 1 WHERE guild_id = ? AND team_num = ?",
+                (guild_id, event["team_num"])
+            )
+        elif kind == "auto_accept_changed":
+            self.conn.execute(
+                "UPDATE teams SET auto_accept = ? WHERE guild_id = ? AND team_num = ?",
+                (int(event["auto_accept"]), guild_id, event["team_num"])
+            )
+        elif kind == "team_closed":
+            self.conn.execute(
+                "UPDATE teams SET is_active = 0 WHERE guild_id = ? AND team_num = ?",
+                (guild_id, event["team_num"])
+            )
+            self.conn.execute("INSERT OR IGNORE INTO closed_slots (guild_id, team_num) VALUES (?, ?)", (guild_id, event["team_num"]))
+        else:
+            print(f"[Guild {guild_id}] Unknown journal event: {kind}")
+    
+    def load(self, manager: GuildTeamManager):
+        guild_id = manager.guild_id
+        with self.read_lock:
+            # One read transaction so the guild's tables come from the same commit
+            self.read_conn.execute("BEGIN")
+            try:
+                row = self.read_conn.execute("SELECT settings FROM guilds WHERE guild_id = ?", (guild_id,)).fetchone()
+                if row is not None:
+                    manager.settings = TeamSettings.from_dict(json.loads(row[0]))
+                    manager.admins = {user_id for (user_id,) in self.read_conn.execute("SELECT user_id FROM admins WHERE guild_id = ?", (guild_id,))}
+                    manager.available_team_nums = {team_num for (team_num,) in self.read_conn.execute("SELECT team_num FROM available_slots WHERE guild_id = ?", (guild_id,))}
+                    manager.closed_teams = {team_num for (team_num,) in self.read_conn.execute("SELECT team_num FROM closed_slots WHERE guild_id = ?", (guild_id,))}
+                    
+                    manager.teams = {}
+                    for team_num, captain_id, created_at, end_time, is_active, halfway_notified, auto_accept in self.read_conn.execute(
+                        "SELECT team_num, captain_id, created_at, end_time, is_active, halfway_notified, auto_accept FROM teams WHERE guild_id = ?", (guild_id,)
+                    ):
+                        manager.teams[team_num] = Team.from_dict({
+                            "team_num": team_num,
+                            "captain_id": captain_id,
+                            "members": {},
+                            "created_at": created_at,
+                            "end_time": end_time,
+                            "is_active": bool(is_active),
+                            "halfway_notified": bool(halfway_notified),
+                            "auto_accept": bool(auto_accept)
+                        }, manager.settings)
+                    
+                    for user_id, team_num, username in self.read_conn.execute(
+                        "SELECT user_id, team_num, username FROM memberships WHERE guild_id = ?", (guild_id,)
+                    ):
+                        if team_num in manager.teams:
+                            manager.teams[team_num].members[user_id] = username
+                    
+                    for team_num, user_id, channel_id, message_id in self.read_conn.execute(
+                        "SELECT team_num, user_id, channel_id, message_id FROM timer_messages WHERE guild_id = ?", (guild_id,)
+                    ):
+                        if team_num in manager.teams:
+                            manager.teams[team_num].timer_message_ids[user_id] = (channel_id, message_id)
+            finally:
+                self.read_conn.execute("COMMIT")
+        
+        if row is None:
+            if (DATA_DIR / str(guild_id)).is_dir():
+                self.migrate_from_json(manager)
+            return
+        
+        # Members of closed teams were already released when the team ended
+        manager.user_teams = {
+            member_id: team_num
+            for team_num, team in manager.teams.items() if team.is_active
+            for member_id in team.members
+        }
+        print(f"[Guild {guild_id}] Loaded from SQLite - {len(manager.teams)} active teams, {len(manager.admins)} admins")
+    
+    def migrate_from_json(self, manager: GuildTeamManager):
+        """One-shot import of a guild's JSON files into the database"""
+        JsonStorage().load(manager)
+        self.write(manager.guild_id, {
+            "settings": manager.settings.to_dict(),
+            "admins": {"admins": list(manager.admins)},
+            "teams": {
+                "teams": {str(num): team.to_dict() for num, team in manager.teams.items()},
+                "available_team_nums": list(manager.available_team_nums),
+                "closed_teams": list(manager.closed_teams)
+            }
+        })
+        print(f"[Guild {manager.guild_id}] Migrated JSON data to SQLite")
+
+def create_storage():
+    backend = os.getenv("STORAGE_BACKEND", "json").lower()
+    if backend == "sqlite":
+        return SqliteStorage(pathlib.Path(os.getenv("SQLITE_PATH", str(DATA_DIR / "bot.sqlite3"))))
+    return JsonStorage()
 
 class MultiGuildManager:
-    """Manages team managers for multiple guilds"""
+    """Manages team managers for multiple guilds, loading them on first use"""
     def __init__(self):
-        self.guild_managers: Dict[int, GuildTeamManager] = {}
+        self.guild_managers: "OrderedDict[int, GuildTeamManager]" = OrderedDict()
+        self.last_used: Dict[int, float] = {}
+        # Guilds with teams are never evicted so their deadlines keep firing
+        self.deadline_guilds: Set[int] = set()
     
     def get_manager(self, guild_id: int) -> GuildTeamManager:
-        """Get or create a manager for a specific guild"""
-        if guild_id not in self.guild_managers:
+        """Get or load the manager for a specific guild"""
+        manager = self.guild_managers.get(guild_id)
+        if manager is None:
             manager = GuildTeamManager(guild_id)
             manager.load_all()
             self.guild_managers[guild_id] = manager
-        return self.guild_managers[guild_id]
+            self.last_used[guild_id] = time.monotonic()
+            self.track_deadlines(manager)
+            # The guild being loaded is in use, it must survive its own eviction pass
+            self.evict_idle(keep=guild_id)
+            # Find out which free slots are ready to hand out
+            warm_pool.warm_guild(manager)
+        
+        self.guild_managers.move_to_end(guild_id)
+        self.last_used[guild_id] = time.monotonic()
+        return manager
+    
+    def track_deadlines(self, manager: GuildTeamManager):
+        """Keep the deadline index in sync with whether the guild has teams"""
+        has_deadlines = bool(manager.teams)
+        if has_deadlines == (manager.guild_id in self.deadline_guilds):
+            return
+        
+        if has_deadlines:
+            self.deadline_guilds.add(manager.guild_id)
+        else:
+            self.deadline_guilds.discard(manager.guild_id)
+        self.mark_deadline_index_dirty()
+    
+    def mark_deadline_index_dirty(self):
+        persistence.mark_file_dirty("deadline index", lambda: (storage.write_deadline_index, sorted(self.deadline_guilds)))
+    
+    def can_evict(self, guild_id: int) -> bool:
+        manager = self.guild_managers[guild_id]
+        return (
+            guild_id not in self.deadline_guilds
+            and not manager.dirty
+            and guild_id not in persistence.dirty_managers
+            # The matchmaking queue only lives in memory
+            and not manager.queue
+        )
     
-    def load_all_guilds(self):
-        """Load data for all guilds that have saved data"""
-        if not DATA_DIR.exists():
+    def evict_idle(self, keep: Optional[int] = None):
+        """Drop managers without teams that are idle or past the cache size, except keep"""
+        # An in-progress flush may still be writing an evictable guild
+        if persistence.flush_lock.locked():
+            return
+        
+        now = time.monotonic()
+        resident = len(self.guild_managers)
+        # OrderedDict iterates least recently used first
+        for guild_id in list(self.guild_managers):
+            over_capacity = resident > GUILD_CACHE_SIZE
+            idle = now - self.last_used.get(guild_id, 0) > GUILD_IDLE_MINUTES * 60
+            if guild_id != keep and (over_capacity or idle) and self.can_evict(guild_id):
+                del self.guild_managers[guild_id]
+                self.last_used.pop(guild_id, None)
+                warm_pool.release_guild(guild_id)
+                resident -= 1
+                print(f"[Guild {guild_id}] Evicted idle manager")
+    
+    def load_deadline_guilds(self):
+        """Load only the guilds that have teams with pending deadlines"""
+        for guild_id in storage.list_deadline_guilds():
+            self.get_manager(guild_id)
+        # The index may have been rebuilt from a full scan
+        self.mark_deadline_index_dirty()
+        print(f"Loaded {len(self.deadline_guilds)} guild(s) with active teams")
+
+class PersistenceWriter:
+    """Coalesces guild saves and flushes them off the event loop"""
+    def __init__(self):
+        self.dirty_managers: Dict[int, GuildTeamManager] = {}
+        self.dirty_files: Dict[str, callable] = {}
+        self.flush_lock = asyncio.Lock()
+    
+    def mark_dirty(self, manager: GuildTeamManager):
+        self.dirty_managers[manager.guild_id] = manager
+    
+    def mark_file_dirty(self, name: str, capture: callable):
+        """Queue bot-wide data; capture runs on the loop at flush time and returns (write function, data)"""
+        self.dirty_files[name] = capture
+    
+    async def flush(self):
+        """Write every dirty guild once, serialization and fsync happen in a worker thread"""
+        async with self.flush_lock:
+            # Bot-wide files go first so the deadline index never misses a guild with teams
+            dirty_files, self.dirty_files = self.dirty_files, {}
+            for name, capture in dirty_files.items():
+                write, data = capture()
+                try:
+                    await asyncio.to_thread(write, data)
+                except Exception as e:
+                    print(f"Error writing {name}: {e}")
+                    self.dirty_files.setdefault(name, capture)
+            
+            dirty_managers, self.dirty_managers = self.dirty_managers, {}
+            for guild_id, manager in dirty_managers.items():
+                work = manager.take_pending_writes()
+                if not work:
+                    continue
+                start = time.monotonic()
+                try:
+                    await asyncio.to_thread(manager.write_pending, work)
+                except Exception as e:
+                    print(f"[Guild {guild_id}] Error writing data: {e}")
+                    metrics.inc("teambot_write_errors_total")
+                    manager.restore_pending_writes(work)
+                metrics.observe("teambot_guild_write_seconds", time.monotonic() - start)
+
+class DeadlineScheduler:
+    """Min-heap of team deadlines that sleeps until the next one is due"""
+    def __init__(self):
+        # Entries are (timestamp, seq, guild_id, team_num, kind)
+        self.heap: List[tuple] = []
+        # Live seq per (guild_id, team_num, kind); heap entries with another seq are cancelled
+        self.entries: Dict[tuple, int] = {}
+        self.counter = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+    
+    def schedule(self, guild_id: int, team_num: int, kind: str, when: datetime):
+        seq = next(self.counter)
+        self.entries[(guild_id, team_num, kind)] = seq
+        heapq.heappush(self.heap, (when.timestamp(), seq, guild_id, team_num, kind))
+        if self.heap[0][1] == seq:
+            self.wakeup.set()
+    
+    def schedule_team(self, guild_id: int, team: Team):
+        """(Re)schedule the halfway notice and the end of a team"""
+        if not team.is_active:
+            return
+        self.schedule(guild_id, team.team_num, "end", team.end_time)
+        if not team.halfway_notified:
+            half_duration = timedelta(minutes=team.settings.duration_minutes) / 2
+            self.schedule(guild_id, team.team_num, "halfway", team.end_time - half_duration)
+    
+    def cancel_team(self, guild_id: int, team_num: int):
+        for kind in ("halfway", "end"):
+            self.entries.pop((guild_id, team_num, kind), None)
+        self.compact()
+    
+    def cancel_guild(self, guild_id: int):
+        for key in [key for key in self.entries if key[0] == guild_id]:
+            del self.entries[key]
+        self.compact()
+    
+    def reschedule_guild(self, guild_id: int):
+        """Recompute deadlines after the guild's settings change"""
+        manager = multi_manager.get_manager(guild_id)
+        for team in manager.teams.values():
+            self.schedule_team(guild_id, team)
+        self.compact()
+    
+    def compact(self):
+        # Cancelled entries are dropped lazily, rebuild once they dominate the heap
+        if len(self.heap) > 2 * len(self.entries) + 64:
+            self.heap = [entry for entry in self.heap if self.entries.get((entry[2], entry[3], entry[4])) == entry[1]]
+            heapq.heapify(self.heap)
+    
+    def rebuild(self):
+        """Rebuild the heap from the persisted end times of every loaded team"""
+        self.heap.clear()
+        self.entries.clear()
+        for guild_id in list(multi_manager.deadline_guilds):
+            manager = multi_manager.get_manager(guild_id)
+            for team in manager.teams.values():
+                self.schedule_team(guild_id, team)
+        print(f"Scheduled {len(self.entries)} team deadline(s)")
+    
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+    
+    async def run(self):
+        while True:
+            # Discard cancelled and superseded entries
+            while self.heap and self.entries.get((self.heap[0][2], self.heap[0][3], self.heap[0][4])) != self.heap[0][1]:
+                heapq.heappop(self.heap)
+            
+            self.wakeup.clear()
+            if not self.heap:
+                await self.wakeup.wait()
+                continue
+            
+            delay = self.heap[0][0] - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            _, _, guild_id, team_num, kind = heapq.heappop(self.heap)
+            del self.entries[(guild_id, team_num, kind)]
+            # One slow team end must not hold up the others
+            asyncio.create_task(self.dispatch(guild_id, team_num, kind))
+    
+    async def dispatch(self, guild_id: int, team_num: int, kind: str):
+        start = time.monotonic()
+        try:
+            if kind == "end":
+                await end_team(guild_id, team_num, auto_end=True)
+            elif kind == "halfway":
+                await notify_halfway(guild_id, team_num)
+        except Exception as e:
+            print(f"[Guild {guild_id}] Error handling {kind} deadline for team {team_num}: {e}")
+            metrics.inc("teambot_deadline_errors_total", kind=kind)
+        metrics.observe("teambot_deadline_seconds", time.monotonic() - start, kind=kind)
+
+class TimerMessageRefresher:
+    """Keeps the timer DMs of each team up to date, batching changes into one edit per message"""
+    def __init__(self):
+        self.pending: Set[Team] = set()
+        self.task: Optional[asyncio.Task] = None
+        self.semaphore = asyncio.Semaphore(TIMER_EDIT_CONCURRENCY)
+        self.channel_locks: Dict[int, asyncio.Lock] = {}
+        self.channel_next_edit: Dict[int, float] = {}
+    
+    def mark(self, team: Team, update: str = None):
+        """Queue a refresh of every timer message recorded for the team"""
+        if update:
+            team.last_update = update
+        self.pending.add(team)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.flush_after_window())
+    
+    async def flush_after_window(self):
+        # Teams marked while the edits below are in flight get another window instead of waiting for an unrelated mark()
+        while True:
+            await asyncio.sleep(TIMER_REFRESH_SECONDS)
+            pending, self.pending = self.pending, set()
+            
+            edits = []
+            for team in pending:
+                embed = await create_timer_embed(team)
+                for channel_id, message_id in list(team.timer_message_ids.values()):
+                    edits.append(self.edit_message(channel_id, message_id, embed))
+            await asyncio.gather(*edits)
+            
+            now = time.monotonic()
+            for channel_id in [c for c, t in self.channel_next_edit.items() if t < now and not self.channel_locks[c].locked()]:
+                del self.channel_next_edit[channel_id]
+                del self.channel_locks[channel_id]
+            
+            if not self.pending:
+                return
+    
+    async def edit_message(self, channel_id: int, message_id: int, embed: discord.Embed):
+        # Message edits are rate limited per channel, so edits to one DM channel are spaced out
+        lock = self.channel_locks.setdefault(channel_id, asyncio.Lock())
+        async with lock:
+            wait = self.channel_next_edit.get(channel_id, 0) - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            
+            async with self.semaphore:
+                for attempt in range(3):
+                    try:
+                        await bot.get_partial_messageable(channel_id).get_partial_message(message_id).edit(embed=embed)
+                        break
+                    except discord.NotFound:
+                        # The user deleted the message or closed the DM
+                        break
+                    except discord.HTTPException as e:
+                        if e.status != 429 and e.status < 500:
+                            print(f"Error editing timer message {message_id}: {e}")
+                            break
+                        await asyncio.sleep(2 ** attempt)
+            
+            self.channel_next_edit[channel_id] = time.monotonic() + TIMER_EDIT_SPACING_SECONDS
+
+class DMResult:
+    """Outcome of a DM to one recipient: sent, forbidden or failed"""
+    def __init__(self, status: str, channel_id: int = None, message_id: int = None):
+        self.status = status
+        self.channel_id = channel_id
+        self.message_id = message_id
+    
+    @property
+    def sent(self) -> bool:
+        return self.status == "sent"
+
+class DMChannelCache:
+    """Persisted map of user id to DM channel id, so repeat DMs go straight to the channel"""
+    def __init__(self):
+        self.channels: Dict[int, int] = {}
+    
+    def load(self):
+        self.channels = storage.load_dm_channels()
+        print(f"Loaded {len(self.channels)} cached DM channel(s)")
+    
+    def get(self, user_id: int) -> Optional[int]:
+        return self.channels.get(user_id)
+    
+    def remember(self, user_id: int, channel_id: int):
+        if self.channels.get(user_id) != channel_id:
+            self.channels[user_id] = channel_id
+            self.mark_dirty()
+    
+    def forget(self, user_id: int):
+        if self.channels.pop(user_id, None) is not None:
+            self.mark_dirty()
+    
+    def mark_dirty(self):
+        persistence.mark_file_dirty("DM channels", lambda: (storage.write_dm_channels, dict(self.channels)))
+
+class OutboundItem:
+    def __init__(self, lane: int, seq: int, factory: callable, shed_result):
+        self.lane = lane
+        self.seq = seq
+        self.factory = factory
+        self.shed_result = shed_result
+        self.future = asyncio.get_running_loop().create_future()
+        self.shed = False
+    
+    def __lt__(self, other):
+        return (self.lane, self.seq) < (other.lane, other.seq)
+
+class OutboundScheduler:
+    """Runs outbound Discord requests by priority lane on a fixed pool of workers"""
+    def __init__(self, workers: int):
+        self.worker_count = workers
+        self.workers: List[asyncio.Task] = []
+        self.queue: List[OutboundItem] = []
+        self.condition = asyncio.Condition()
+        self.counter = itertools.count()
+        self.interactions_in_flight = 0
+        self.interactions_idle = asyncio.Event()
+        self.interactions_idle.set()
+        self.lane_stats = {
+            lane: {"depth": 0, "submitted": 0, "completed": 0, "shed": 0}
+            for lane in LANE_NAMES
+        }
+    
+    def start(self):
+        self.workers = [worker for worker in self.workers if not worker.done()]
+        while len(self.workers) < self.worker_count:
+            self.workers.append(asyncio.create_task(self.run_worker()))
+    
+    async def submit(self, lane: int, factory: callable, shed_result=None):
+        """Run factory() in its lane and return its result"""
+        stats = self.lane_stats[lane]
+        stats["submitted"] += 1
+        
+        if lane == LANE_INTERACTION:
+            # Interaction responses never wait for a worker, they hold back bulk lanes instead
+            self.interactions_in_flight += 1
+            self.interactions_idle.clear()
+            try:
+                return await factory()
+            finally:
+                stats["completed"] += 1
+                self.interactions_in_flight -= 1
+                if not self.interactions_in_flight:
+                    self.interactions_idle.set()
+        
+        item = OutboundItem(lane, next(self.counter), factory, shed_result)
+        async with self.condition:
+            heapq.heappush(self.queue, item)
+            stats["depth"] += 1
+            self.shed_under_pressure()
+            self.condition.notify()
+        return await item.future
+    
+    def shed_under_pressure(self):
+        queued = sum(stats["depth"] for stats in self.lane_stats.values())
+        if queued <= OUTBOUND_QUEUE_LIMIT:
+            return
+        
+        # Drop the oldest admin notifications first, everything else is worth delivering late
+        admin_items = sorted(item for item in self.queue if item.lane == LANE_ADMIN and not item.shed)
+        shed = 0
+        for item in admin_items[:queued - OUTBOUND_QUEUE_LIMIT]:
+            self.finish(item)
+            item.shed = True
+            item.future.set_result(item.shed_result)
+            self.lane_stats[LANE_ADMIN]["shed"] += 1
+            shed += 1
+        if shed:
+            print(f"Outbound queue over {OUTBOUND_QUEUE_LIMIT}, shed {shed} admin message(s)")
+    
+    def finish(self, item: OutboundItem):
+        self.lane_stats[item.lane]["depth"] -= 1
+    
+    async def run_worker(self):
+        while True:
+            async with self.condition:
+                await self.condition.wait_for(lambda: self.queue)
+                item = heapq.heappop(self.queue)
+            if item.shed:
+                continue
+            
+            if item.lane > LANE_JOIN_REQUEST and self.interactions_in_flight:
+                # Give interaction responses a head start, but never starve bulk lanes for long
+                try:
+                    await asyncio.wait_for(self.interactions_idle.wait(), timeout=1)
+                except asyncio.TimeoutError:
+                    pass
+            
+            self.finish(item)
+            try:
+                item.future.set_result(await item.factory())
+            except Exception as e:
+                item.future.set_exception(e)
+            self.lane_stats[item.lane]["completed"] += 1
+    
+    def describe(self) -> str:
+        return " | ".join(f"{LANE_NAMES[lane]} {stats['depth']}" for lane, stats in self.lane_stats.items())
+
+async def followup(interaction: discord.Interaction, *args, **kwargs):
+    """Send an interaction followup in the highest priority lane"""
+    return await outbound.submit(LANE_INTERACTION, lambda: interaction.followup.send(*args, **kwargs))
+
+class DMSender:
+    """Delivers DMs through the outbound lanes with per-route backoff and retries"""
+    def __init__(self):
+        # Route -> monotonic time before which nothing else is sent on it
+        self.route_retry_at: Dict[str, float] = {}
+    
+    async def wait_for_route(self, route: str):
+        wait = self.route_retry_at.get(route, 0) - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+    
+    def back_off_route(self, route: str, error: discord.HTTPException, attempt: int) -> float:
+        retry_after = None
+        if error.response is not None:
+            retry_after = error.response.headers.get("Retry-After")
+        delay = float(retry_after) if retry_after else 2 ** attempt
+        if error.status == 429:
+            # Everyone sharing the bucket waits, not just this recipient
+            self.route_retry_at[route] = max(self.route_retry_at.get(route, 0), time.monotonic() + delay)
+        return delay
+    
+    async def resolve_channel(self, user_id: int):
+        """Find the DM channel from the cache, then the gateway cache, fetching the user only as a last resort"""
+        user = bot.get_user(user_id)
+        if user is None:
+            await self.wait_for_route("users")
+            user = await bot.fetch_user(user_id)
+        return user.dm_channel or await user.create_dm()
+    
+    async def send(self, user_id: int, content: str = None, embed: discord.Embed = None, view: discord.ui.View = None, lane: int = LANE_TEAM) -> DMResult:
+        start = time.monotonic()
+        result = await outbound.submit(
+            lane,
+            lambda: self.deliver(user_id, content=content, embed=embed, view=view),
+            shed_result=DMResult("shed")
+        )
+        # Includes the time spent waiting in the lane
+        metrics.observe("teambot_dm_seconds", time.monotonic() - start, lane=LANE_NAMES[lane])
+        metrics.inc("teambot_dms_total", lane=LANE_NAMES[lane], status=result.status)
+        return result
+    
+    async def deliver(self, user_id: int, content: str = None, embed: discord.Embed = None, view: discord.ui.View = None) -> DMResult:
+        route = "dm_channel"
+        for attempt in range(DM_MAX_RETRIES + 1):
+            await self.wait_for_route(route)
+            try:
+                channel_id = dm_channels.get(user_id)
+                if channel_id:
+                    channel = bot.get_partial_messageable(channel_id, type=discord.ChannelType.private)
+                    try:
+                        msg = await channel.send(content=content, embed=embed, view=view)
+                        return DMResult("sent", msg.channel.id, msg.id)
+                    except discord.NotFound:
+                        # The cached channel no longer exists, resolve it again below
+                        dm_channels.forget(user_id)
+                
+                route = "users"
+                channel = await self.resolve_channel(user_id)
+                route = "dm_channel"
+                msg = await channel.send(content=content, embed=embed, view=view)
+                dm_channels.remember(user_id, msg.channel.id)
+                return DMResult("sent", msg.channel.id, msg.id)
+            except discord.Forbidden:
+                return DMResult("forbidden")
+            except discord.NotFound:
+                return DMResult("failed")
+            except discord.HTTPException as e:
+                if e.status != 429 and e.status < 500:
+                    print(f"Error sending DM to {user_id}: {e}")
+                    return DMResult("failed")
+                if attempt < DM_MAX_RETRIES:
+                    await asyncio.sleep(self.back_off_route(route, e, attempt))
+            except Exception as e:
+                print(f"Error sending DM to {user_id}: {e}")
+                return DMResult("failed")
+        return DMResult("failed")
+
+class NotificationOutbox:
+    """On-disk queue of DMs so lifecycle notifications survive a restart"""
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        # Idempotency key -> queued notification, in the order it was queued
+        self.pending: Dict[str, dict] = {}
+        # Idempotency key -> time it was delivered
+        self.done: Dict[str, float] = {}
+        self.attempts: Dict[str, int] = {}
+        self.done_lines = 0
+        self.write_lock = asyncio.Lock()
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+    
+    def load(self):
+        self.pending.clear()
+        self.done.clear()
+        self.done_lines = 0
+        if not self.path.exists():
+            return
+        
+        try:
+            with open(self.path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn final line from a crash mid-append
+                        break
+                    if record["op"] == "add":
+                        if record["key"] not in self.done:
+                            self.pending[record["key"]] = record
+                    else:
+                        self.pending.pop(record["key"], None)
+                        self.done[record["key"]] = record["at"]
+                        self.done_lines += 1
+            print(f"Loaded {len(self.pending)} pending notification(s) from the outbox")
+            self.compact()
+        except Exception as e:
+            print(f"Error loading outbox: {e}")
+    
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+        if self.pending:
+            self.wakeup.set()
+    
+    async def enqueue(self, key: str, user_ids, embed: discord.Embed = None, content: str = None, lane: int = LANE_TEAM):
+        """Durably queue one DM per recipient, skipping any already queued or delivered under key"""
+        records = []
+        for user_id in dict.fromkeys(user_ids):
+            item_key = f"{key}:{user_id}"
+            if item_key in self.pending or item_key in self.done:
+                continue
+            record = {
+                "op": "add",
+                "key": item_key,
+                "user_id": user_id,
+                "lane": lane,
+                "content": content,
+                "embed": embed.to_dict() if embed else None
+            }
+            self.pending[item_key] = record
+            records.append(record)
+        
+        if records:
+            await self.append(records)
+            self.wakeup.set()
+    
+    async def append(self, records: List[dict]):
+        async with self.write_lock:
+            await asyncio.to_thread(self.append_sync, records)
+    
+    def append_sync(self, records: List[dict]):
+        DATA_DIR.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'a') as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def compact_records(self) -> List[dict]:
+        """Snapshot of what a compacted outbox holds, taken on the loop so enqueue() can't change it mid-write"""
+        cutoff = time.time() - OUTBOX_DONE_RETENTION_HOURS * 3600
+        self.done = {key: at for key, at in self.done.items() if at >= cutoff}
+        self.done_lines = len(self.done)
+        return [{"op": "done", "key": key, "at": at} for key, at in self.done.items()] + list(self.pending.values())
+    
+    def compact(self):
+        self.write_compacted(self.compact_records())
+    
+    def write_compacted(self, records: List[dict]):
+        """Rewrite the outbox with only pending items and recently delivered keys"""
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, 'w') as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+    
+    async def deliver(self, record: dict) -> DMResult:
+        embed = discord.Embed.from_dict(record["embed"]) if record["embed"] else None
+        return await dm_sender.send(record["user_id"], content=record["content"], embed=embed, lane=record["lane"])
+    
+    async def run(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            
+            while self.pending:
+                batch = list(self.pending.values())[:OUTBOX_BATCH_SIZE]
+                results = await asyncio.gather(*(self.deliver(record) for record in batch), return_exceptions=True)
+                
+                finished = []
+                for record, result in zip(batch, results):
+                    key = record["key"]
+                    if isinstance(result, DMResult) and result.status == "shed":
+                        # Dropped to relieve the outbound queue, try again once it has drained
+                        continue
+                    if isinstance(result, Exception):
+                        self.attempts[key] = self.attempts.get(key, 0) + 1
+                        if self.attempts[key] < OUTBOX_MAX_ATTEMPTS:
+                            continue
+                        print(f"Dropping notification {key} after {OUTBOX_MAX_ATTEMPTS} attempts: {result}")
+                    # Forbidden and failed DMs were already retried by the sender, they won't succeed later
+                    finished.append(key)
+                
+                now = time.time()
+                for key in finished:
+                    self.pending.pop(key, None)
+                    self.attempts.pop(key, None)
+                    self.done[key] = now
+                async with self.write_lock:
+                    try:
+                        await asyncio.to_thread(self.append_sync, [{"op": "done", "key": key, "at": now} for key in finished])
+                        self.done_lines += len(finished)
+                        if self.done_lines > JOURNAL_COMPACT_THRESHOLD:
+                            await asyncio.to_thread(self.write_compacted, self.compact_records())
+                    except Exception as e:
+                        print(f"Error writing outbox: {e}")
+                
+                if len(finished) < len(batch):
+                    # Something keeps failing, give it a moment before trying again
+                    await asyncio.sleep(5)
+
+class AdminDigest:
+    """Collects routine admin notifications per guild and sends one summary per window"""
+    def __init__(self):
+        # Guild id -> section -> entries, in the order they happened
+        self.events: Dict[int, Dict[str, List[str]]] = {}
+        self.tasks: Dict[int, asyncio.Task] = {}
+    
+    def add(self, guild_id: int, section: str, entry: str):
+        entries = self.events.setdefault(guild_id, {}).setdefault(section, [])
+        if entry not in entries:
+            entries.append(entry)
+        task = self.tasks.get(guild_id)
+        if task is None or task.done():
+            self.tasks[guild_id] = asyncio.create_task(self.flush_after_window(guild_id))
+    
+    async def flush_after_window(self, guild_id: int):
+        # Entries added while the digest is being queued start the next window right away
+        while True:
+            await asyncio.sleep(ADMIN_DIGEST_SECONDS)
+            await self.flush(guild_id)
+            if not self.events.get(guild_id):
+                return
+    
+    async def flush(self, guild_id: int):
+        events = self.events.pop(guild_id, None)
+        if not events:
+            return
+        
+        embed = discord.Embed(
+            title="Admin Digest",
+            description=f"Activity in the last {int(ADMIN_DIGEST_SECONDS // 60) or 1} minute(s)",
+            color=discord.Color.blue()
+        )
+        for section, name in DIGEST_SECTIONS.items():
+            entries = events.get(section)
+            if entries:
+                value = "\n".join(entries)
+                # Embed field values are capped at 1024 characters
+                if len(value) > 1024:
+                    value = value[:1000].rsplit("\n", 1)[0] + "\n..."
+                embed.add_field(name=name, value=value, inline=False)
+        
+        await self.send_now(guild_id, f"admin_digest:{guild_id}:{time.time_ns()}", embed)
+    
+    async def flush_all(self):
+        for guild_id in list(self.events):
+            await self.flush(guild_id)
+    
+    async def send_now(self, guild_id: int, key: str, embed: discord.Embed):
+        """Queue an urgent notification to the guild's admins without waiting for the digest"""
+        manager = multi_manager.get_manager(guild_id)
+        await outbox.enqueue(key, manager.admins, embed=embed, lane=LANE_ADMIN)
+
+class Matchmaker:
+    """Places users waiting in /queue: tops up auto-accept teams, then forms new teams"""
+    def __init__(self):
+        self.tasks: Dict[int, asyncio.Task] = {}
+        # Guilds kicked while a pass was already running
+        self.rerun: Set[int] = set()
+    
+    def kick(self, guild_id: int):
+        """Run a matching pass for the guild once the current window closes"""
+        task = self.tasks.get(guild_id)
+        if task is None or task.done():
+            self.tasks[guild_id] = asyncio.create_task(self.match_after_window(guild_id))
+        else:
+            # The running pass may already be past reading the queue
+            self.rerun.add(guild_id)
+    
+    async def match_after_window(self, guild_id: int):
+        while True:
+            await asyncio.sleep(MATCHMAKING_WINDOW_SECONDS)
+            self.rerun.discard(guild_id)
+            try:
+                await self.match(guild_id)
+            except Exception as e:
+                print(f"[Guild {guild_id}] Error matching queued users: {e}")
+            if guild_id not in self.rerun:
+                return
+    
+    def take_queued(self, manager: GuildTeamManager, count: int) -> List[tuple]:
+        return [manager.queue.popitem(last=False) for _ in range(min(count, len(manager.queue)))]
+    
+    async def match(self, guild_id: int):
+        manager = multi_manager.get_manager(guild_id)
+        team_size = manager.settings.max_team_size
+        
+        # Users who found a team some other way since they queued
+        for user_id in [user_id for user_id in manager.queue if user_id in manager.user_teams]:
+            del manager.queue[user_id]
+        if not manager.queue or team_size < 1:
+            return
+        
+        # Running teams that take anyone fill up before new teams are opened
+        joins = []
+        for team_num in list(manager.joinable_by_number):
+            team = manager.teams[team_num]
+            if not manager.queue:
+                break
+            if team.auto_accept:
+                for user_id, username in self.take_queued(manager, team_size - len(team.members)):
+                    joins.append(add_member(manager, team, user_id, username))
+        await asyncio.gather(*joins)
+        
+        formed = []
+        while len(manager.queue) >= team_size:
+            team_num = manager.allocate_team_num()
+            if team_num is None:
+                break
+            formed.append(self.form_team(manager, team_num, self.take_queued(manager, team_size)))
+        await asyncio.gather(*formed)
+        
+        if manager.queue:
+            print(f"[Guild {guild_id}] {len(manager.queue)} user(s) still waiting in the queue")
+    
+    async def form_team(self, manager: GuildTeamManager, team_num: int, members: List[tuple]):
+        captain_id = members[0][0]
+        team = Team(team_num, captain_id, manager.settings)
+        team.members = dict(members)
+        team.last_update = "Formed from the queue"
+        manager.teams[team_num] = team
+        for user_id, _ in members:
+            manager.user_teams[user_id] = team_num
+        
+        # Every member gets one DM, the timer message, which already lists the whole team
+        timer_embed = await create_timer_embed(team)
+        results = await asyncio.gather(*(send_dm(user_id, embed=timer_embed, lane=LANE_JOIN_REQUEST) for user_id, _ in members))
+        for (user_id, _), (dm_sent, channel_id, msg_id) in zip(members, results):
+            if not dm_sent:
+                # They would never hear about the team, so they're left out of it
+                del team.members[user_id]
+                manager.user_teams.pop(user_id, None)
+            elif channel_id and msg_id:
+                team.timer_message_ids[user_id] = (channel_id, msg_id)
+        
+        if not team.members:
+            del manager.teams[team_num]
+            manager.available_team_nums.add(team_num)
+            warm_pool.warm(manager.guild_id, team_num)
+            return
+        if team.captain_id not in team.members:
+            team.captain_id = next(iter(team.members))
+        
+        manager.record_event("team_created", team=team.to_dict())
+        scheduler.schedule_team(manager.guild_id, team)
+        warm_pool.track_team(manager.guild_id, team)
+        admin_digest.add(manager.guild_id, "formed", f"Team {team_num} ({', '.join(team.members.values())})")
+        if len(team.members) < len(members):
+            timer_refresher.mark(team)
+
+class SpamClient:
+    """Runs SPAM Status operations in-process over one shared Proxmox session, falling back to status.py"""
+    def __init__(self, spam_dir: pathlib.Path):
+        self.spam_dir = spam_dir
+        self.in_process = SPAM_IN_PROCESS
+        self.status = None
+        self.connect_lock = asyncio.Lock()
+    
+    def connect_sync(self):
+        # SPAM uses flat imports (cli, utils.utils, ...) relative to its own directory
+        if str(self.spam_dir) not in sys.path:
+            sys.path.insert(0, str(self.spam_dir))
+        from status import Status
+        
+        status = Status([])
+        status.load_env()
+        if not status.default_node:
+            raise ValueError("PROXMOX_DEFAULT_NODE must be set")
+        status.connect()
+        print(f"Connected to Proxmox at {status.promxox_host} as {status.proxmox_user}")
+        return status
+    
+    async def get_status(self):
+        """The shared Status instance, logging in on first use"""
+        async with self.connect_lock:
+            if self.status is None:
+                self.status = await asyncio.to_thread(self.connect_sync)
+        return self.status
+    
+    def vm_nodes(self, status, first: int, last: int) -> Dict[int, str]:
+        """The node each VM in the range lives on, from SPAM's cached VMID index"""
+        nodes = {}
+        for vmid in range(first, last + 1):
+            try:
+                nodes[vmid] = status.resources.get(vmid)["node"]
+            except FileNotFoundError:
+                # Let the operation itself report the missing VM
+                nodes[vmid] = status.default_node
+        return nodes
+    
+    def run_on_nodes(self, status, func, nodes: Dict[int, str]) -> Dict[int, Exception]:
+        from utils.utils import run_parallel
+        # SPAM's per-node limit applies to the node each VM is actually on
+        jobs = {vmid: (node, functools.partial(func, node, vmid=vmid)) for vmid, node in nodes.items()}
+        return run_parallel(jobs, status.max_jobs, status.node_jobs)
+    
+    def reset_sync(self, status, first: int, last: int) -> List[str]:
+        # Same as status.py --revert -s, each VM starts as soon as its own rollback is done.
+        # The Status instance is shared by concurrent resets, so its failures dict isn't used
+        nodes = self.vm_nodes(status, first, last)
+        failures = self.run_on_nodes(status, status._revert_and_start_vm, nodes)
+        errors = [f"VMID {vmid}: {error}" for vmid, error in sorted(failures.items())]
+        
+        # Check where every other VM ended up
+        for vmid, node in nodes.items():
+            if vmid in failures:
+                continue
+            try:
+                state = status.prox.nodes(node).qemu(vmid).status.current.get()["status"]
+                if state != "running":
+                    errors.append(f"VMID {vmid} is {state}")
+            except Exception as e:
+                errors.append(f"VMID {vmid}: {e}")
+        return errors
+    
+    async def reset_range(self, first: int, last: int, log_prefix: str) -> List[str]:
+        """Revert every VM in the range to its base snapshot and start it again, returns the errors"""
+        if self.in_process:
+            try:
+                status = await self.get_status()
+                return await asyncio.to_thread(self.reset_sync, status, first, last)
+            except ImportError as e:
+                print(f"SPAM can't be imported in-process, using status.py instead: {e}")
+                self.in_process = False
+            except Exception as e:
+                # Most likely an expired or rejected login, reconnect on the next reset
+                print(f"{log_prefix} In-process reset failed, retrying with status.py: {e}")
+                self.status = None
+        
+        error = await self.run_script(["--revert", "-s", "-r", str(first), str(last)])
+        if error:
+            print(f"{log_prefix} Error (revert) status.py: {error}")
+            return [f"revert: {error[-300:]}"]
+        return []
+    
+    def cluster_vms_sync(self, status) -> Dict[int, dict]:
+        # Also refreshes SPAM's own VMID index for the resets that follow
+        return dict(status.resources.refresh())
+    
+    async def cluster_vms(self) -> Optional[Dict[int, dict]]:
+        """Status and node of every VM in the cluster from a single query, or None without in-process SPAM"""
+        if not self.in_process:
+            return None
+        try:
+            status = await self.get_status()
+            return await asyncio.to_thread(self.cluster_vms_sync, status)
+        except ImportError:
+            self.in_process = False
+        except Exception as e:
+            print(f"Error listing cluster VMs: {e}")
+            self.status = None
+        return None
+    
+    def agent_ready_sync(self, status, node: str, vmid: int) -> bool:
+        try:
+            status.prox.nodes(node).qemu(vmid).agent.ping.post()
+            return True
+        except Exception as e:
+            # A VM without a guest agent is as ready as it gets once it runs
+            return "No QEMU guest agent configured" in str(e)
+    
+    async def agent_ready(self, node: str, vmid: int) -> bool:
+        try:
+            status = await self.get_status()
+            return await asyncio.to_thread(self.agent_ready_sync, status, node, vmid)
+        except Exception as e:
+            print(f"Error pinging the guest agent of VMID {vmid}: {e}")
+            return False
+    
+    async def start_range(self, first: int, last: int):
+        if not self.in_process:
+            return
+        status = await self.get_status()
+        await asyncio.to_thread(self.start_sync, status, first, last)
+    
+    def start_sync(self, status, first: int, last: int):
+        failures = self.run_on_nodes(status, status._start_vm, self.vm_nodes(status, first, last))
+        if failures:
+            raise Exception("; ".join(f"VMID {vmid}: {error}" for vmid, error in sorted(failures.items())))
+    
+    async def run_script(self, args: List[str]) -> Optional[str]:
+        try:
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, str(self.spam_dir / "status.py"), *args,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+            )
+            stdout, stderr = await process.communicate()
+            if process.returncode != 0:
+                # status.py lists per-VM failures on stdout, tracebacks go to stderr
+                output = (stdout + stderr).decode().strip()
+                return output or f"status.py exited with status {process.returncode}"
+        except Exception as e:
+            return f"Failed to start subprocess: {e}"
+        return None
+
+class ResetJobQueue:
+    """Runs team VM resets in the background with retries and a global limit"""
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        # Job id -> job, queued and running jobs plus recent history
+        self.jobs: Dict[str, dict] = {}
+        self.condition = asyncio.Condition()
+        self.workers: List[asyncio.Task] = []
+        # Snapshots are numbered on the loop; the lock serializes writes from the flush and
+        # submit, and an older snapshot is never written over a newer one
+        self.version = 0
+        self.written_version = 0
+        self.write_lock = threading.Lock()
+    
+    def load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r') as f:
+                self.jobs = json.load(f)
+        except Exception as e:
+            print(f"Error loading reset jobs: {e}")
+            return
+        
+        for job in self.jobs.values():
+            if job["state"] == "running":
+                # Interrupted by the restart, run it again
+                job["state"] = "queued"
+                job["next_attempt_at"] = 0
+        queued = sum(1 for job in self.jobs.values() if job["state"] == "queued")
+        print(f"Loaded {queued} queued VM reset job(s)")
+    
+    def start(self):
+        self.workers = [worker for worker in self.workers if not worker.done()]
+        while len(self.workers) < PROXMOX_CONCURRENCY:
+            self.workers.append(asyncio.create_task(self.run_worker()))
+    
+    def snapshot(self) -> tuple:
+        self.version += 1
+        return self.version, {job_id: dict(job) for job_id, job in self.jobs.items()}
+    
+    def mark_dirty(self):
+        persistence.mark_file_dirty("reset jobs", lambda: (self.write_sync, self.snapshot()))
+    
+    def write_sync(self, snapshot: tuple):
+        version, jobs = snapshot
+        with self.write_lock:
+            if version < self.written_version:
+                return
+            DATA_DIR.mkdir(parents=True, exist_ok=True)
+            write_json_atomic(self.path, jobs)
+            self.written_version = version
+    
+    async def submit(self, guild_id: int, team: Team, first: int, last: int, reason: str):
+        """Queue a reset of the team's VMs; its slot stays closed until the job finishes"""
+        job_id = notification_key("vm_reset", guild_id, team)
+        if job_id in self.jobs and self.jobs[job_id]["state"] != "failed":
+            return
+        
+        self.jobs[job_id] = {
+            "guild_id": guild_id,
+            "team_num": team.team_num,
+            "created": int(team.end_time.timestamp()),
+            "first": first,
+            "last": last,
+            "reason": reason,
+            "state": "queued",
+            "attempts": 0,
+            "next_attempt_at": 0,
+            "queued_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "error": None
+        }
+        # Written right away so a restart can't lose the reset of a closed slot
+        try:
+            await asyncio.to_thread(self.write_sync, self.snapshot())
+        except Exception as e:
+            # The job is queued in memory either way, the next flush retries the write
+            print(f"[Guild {guild_id}] Error writing reset jobs: {e}")
+            self.mark_dirty()
+        async with self.condition:
+            self.condition.notify()
+    
+    def next_job(self) -> tuple:
+        """The oldest runnable job id, and how long until a waiting retry becomes runnable"""
+        now = time.time()
+        wait = None
+        for job_id, job in sorted(self.jobs.items(), key=lambda item: item[1]["queued_at"]):
+            if job["state"] != "queued":
+                continue
+            if job["next_attempt_at"] > now:
+                delay = job["next_attempt_at"] - now
+                wait = delay if wait is None else min(wait, delay)
+                continue
+            return job_id, wait
+        return None, wait
+    
+    async def run_worker(self):
+        while True:
+            async with self.condition:
+                job_id, wait = self.next_job()
+                while job_id is None:
+                    try:
+                        await asyncio.wait_for(self.condition.wait(), timeout=wait)
+                    except asyncio.TimeoutError:
+                        pass
+                    job_id, wait = self.next_job()
+                
+                job = self.jobs[job_id]
+                # /reset or /reopen_team may have handed the slot to someone else since the job was queued
+                if not self.owns_slot(job):
+                    self.cancel(job, "The slot was reset or reopened")
+                    continue
+                job["state"] = "running"
+                job["started_at"] = time.time()
+                job["attempts"] += 1
+            self.mark_dirty()
+            
+            try:
+                await self.run_job(job)
+            except Exception as e:
+                print(f"[Guild {job['guild_id']}] Error running reset job for team {job['team_num']}: {e}")
+                job["state"] = "failed"
+                job["error"] = str(e)
+            finally:
+                self.prune_history()
+                self.mark_dirty()
+    
+    async def run_job(self, job: dict):
+        guild_id, team_num = job["guild_id"], job["team_num"]
+        log_prefix = f"[Guild {guild_id}] Team {team_num}"
+        start = time.monotonic()
+        errors = await spam_client.reset_range(job["first"], job["last"], log_prefix)
+        metrics.observe("teambot_vm_reset_seconds", time.monotonic() - start, outcome="failed" if errors else "ok")
+        job["finished_at"] = time.time()
+        
+        if errors and job["attempts"] < RESET_MAX_ATTEMPTS:
+            delay = RESET_RETRY_SECONDS * 2 ** (job["attempts"] - 1)
+            print(f"{log_prefix} VM reset attempt {job['attempts']} failed, retrying in {delay}s")
+            job["state"] = "queued"
+            job["error"] = "\n".join(errors)
+            job["next_attempt_at"] = time.time() + delay
             return
         
-        for guild_dir in DATA_DIR.iterdir():
-            if guild_dir.is_dir() and guild_dir.name.isdigit():
-                guild_id = int(guild_dir.name)
-                manager = GuildTeamManager(guild_id)
-                manager.load_all()
-                self.guild_managers[guild_id] = manager
-                print(f"Loaded data for guild {guild_id}")
+        manager = multi_manager.get_manager(guild_id)
+        if errors:
+            job["state"] = "failed"
+            job["error"] = "\n".join(errors)
+            # A failed reset needs an admin before the slot is reused, so it skips the digest.
+            # The slot stays closed until an admin runs /reopen_team
+            error_embed = discord.Embed(
+                title=f"Team {team_num} - VM Reset Failed",
+                description=f"VMIDs {job['first']}-{job['last']} may need a manual reset. Use `/reopen_team {team_num}` once they're fixed.",
+                color=discord.Color.red()
+            )
+            error_embed.add_field(name="Errors", value=job["error"][:1024], inline=False)
+            await admin_digest.send_now(guild_id, f"vm_reset_failed:{guild_id}:{team_num}:{job['created']}", error_embed)
+            return
+        
+        job["state"] = "done"
+        job["error"] = None
+        admin_digest.add(guild_id, "ended", f"Team {team_num} ({job['reason']}), VMs reverted")
+        
+        team = get_request_team(manager, team_num, job["created"])
+        closed = manager.teams.get(team_num)
+        # The slot may have been reset or reopened and reused while the job ran
+        if team is None and closed is not None and not closed.is_active and int(closed.end_time.timestamp()) == job["created"]:
+            manager.closed_teams.discard(team_num)
+            manager.available_team_nums.add(team_num)
+            del manager.teams[team_num]
+            
+            # Journal the freed slot after the reset
+            manager.record_event("slot_freed", team_num=team_num)
+            # The job just reverted and started the VMs, wait for the guests to come up
+            warm_pool.reverted.add((guild_id, team_num))
+            warm_pool.set_state(guild_id, team_num, "started")
+            warm_pool.warm(guild_id, team_num)
+    
+    def owns_slot(self, job: dict) -> bool:
+        """Whether the slot is still closed for the team the job was queued for"""
+        manager = multi_manager.get_manager(job["guild_id"])
+        closed = manager.teams.get(job["team_num"])
+        return (
+            job["team_num"] in manager.closed_teams
+            and closed is not None
+            and not closed.is_active
+            and int(closed.end_time.timestamp()) == job["created"]
+        )
+    
+    def cancel(self, job: dict, reason: str):
+        job["state"] = "cancelled"
+        job["error"] = reason
+        job["finished_at"] = time.time()
+        job["started_at"] = job["started_at"] or job["finished_at"]
+        self.prune_history()
+        self.mark_dirty()
+    
+    def cancel_slots(self, guild_id: int, team_nums: set = None):
+        """Drop the queued resets of the guild's slots, all of them when team_nums is None"""
+        for job in list(self.jobs.values()):
+            if job["guild_id"] == guild_id and job["state"] == "queued" and (team_nums is None or job["team_num"] in team_nums):
+                self.cancel(job, "The slot was reset or reopened")
+    
+    def running_slots(self, guild_id: int) -> Set[int]:
+        """Slots whose VMs are being reverted right now, they can't be handed out until that finishes"""
+        return {job["team_num"] for job in self.jobs.values() if job["guild_id"] == guild_id and job["state"] == "running"}
+    
+    def prune_history(self):
+        finished = sorted(
+            (job_id for job_id, job in self.jobs.items() if job["state"] in ("done", "failed", "cancelled")),
+            key=lambda job_id: self.jobs[job_id]["finished_at"] or 0
+        )
+        for job_id in finished[:-RESET_HISTORY_SIZE]:
+            del self.jobs[job_id]
+    
+    def describe_job(self, job: dict) -> str:
+        now = time.time()
+        line = f"Team {job['team_num']} (VMIDs {job['first']}-{job['last']})"
+        if job["state"] == "queued":
+            line += f" waiting {int(now - job['queued_at'])}s"
+            if job["attempts"]:
+                line += f", retry {job['attempts'] + 1}/{RESET_MAX_ATTEMPTS}"
+        elif job["state"] == "running":
+            line += f" running {int(now - job['started_at'])}s"
+        else:
+            line += f" took {int(job['finished_at'] - job['started_at'])}s"
+        if job["state"] in ("failed", "cancelled") and job["error"]:
+            line += f": {job['error'].splitlines()[0][:100]}"
+        return line
 
+class WarmPool:
+    """Tracks how ready each slot's VMs are, warms up free slots and tells new teams when their VMs are up"""
+    def __init__(self):
+        # (guild id, team num) -> one of WARM_STATES, free slots only
+        self.states: Dict[tuple, str] = {}
+        # Free slots whose VMs a reset job reverted, the only ones that can be handed out as ready
+        self.reverted: Set[tuple] = set()
+        # (guild id, team num) -> deadline, whether the VMs were started, guest agents seen up,
+        # and the end time of the team waiting on the slot (None for a free slot)
+        self.watched: Dict[tuple, dict] = {}
+        self.wakeup = asyncio.Event()
+        self.probe_semaphore = asyncio.Semaphore(PROXMOX_CONCURRENCY)
+        self.task = None
+    
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+    
+    def state(self, guild_id: int, team_num: int) -> str:
+        return self.states.get((guild_id, team_num), "unknown")
+    
+    def set_state(self, guild_id: int, team_num: int, state: str):
+        self.states[(guild_id, team_num)] = state
+    
+    def release(self, guild_id: int, team_num: int):
+        """The slot was handed to a team, stop tracking it as free"""
+        self.states.pop((guild_id, team_num), None)
+        self.reverted.discard((guild_id, team_num))
+        entry = self.watched.get((guild_id, team_num))
+        if entry is not None and entry["created"] is None:
+            del self.watched[(guild_id, team_num)]
+    
+    def release_guild(self, guild_id: int):
+        for key in [key for key in self.states if key[0] == guild_id]:
+            self.release(*key)
+        self.reverted = {key for key in self.reverted if key[0] != guild_id}
+        for key in [key for key in self.watched if key[0] == guild_id]:
+            del self.watched[key]
+    
+    def watch(self, guild_id: int, team_num: int, created: int = None):
+        self.watched[(guild_id, team_num)] = {
+            "deadline": time.monotonic() + WARM_TIMEOUT_SECONDS,
+            "started": False,
+            "agents": set(),
+            "created": created
+        }
+        self.wakeup.set()
+    
+    def warm(self, guild_id: int, team_num: int):
+        """Start watching a free slot until its VMs are ready"""
+        if (guild_id, team_num) not in self.watched:
+            self.watch(guild_id, team_num)
+    
+    def warm_guild(self, manager: GuildTeamManager):
+        for team_num in manager.available_team_nums:
+            if self.state(manager.guild_id, team_num) != "ready":
+                self.warm(manager.guild_id, team_num)
+    
+    def track_team(self, guild_id: int, team: Team):
+        """DM the new team once every VM in its range is up"""
+        self.watch(guild_id, team.team_num, int(team.end_time.timestamp()))
+    
+    async def run(self):
+        while True:
+            if not self.watched:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+            try:
+                await self.tick()
+            except Exception as e:
+                print(f"Error checking VM readiness: {e}")
+            await asyncio.sleep(WARM_POLL_SECONDS)
+    
+    async def tick(self):
+        # One cluster-wide query covers every watched range
+        vms = await spam_client.cluster_vms()
+        await asyncio.gather(*(self.check(key, entry, vms) for key, entry in list(self.watched.items())))
+    
+    async def check(self, key: tuple, entry: dict, vms: Optional[Dict[int, dict]]):
+        guild_id, team_num = key
+        manager = multi_manager.guild_managers.get(guild_id)
+        team = None
+        if manager is not None and entry["created"] is not None:
+            team = get_request_team(manager, team_num, entry["created"])
+            waiting = team is not None
+        else:
+            waiting = manager is not None and team_num in manager.available_team_nums
+        # Stop once the slot is taken, the team has ended or the guild has been unloaded
+        if not waiting or not manager.settings.number_of_machines:
+            self.drop(key, entry)
+            return
+        
+        # Readiness can't be checked without in-process SPAM
+        state = "unknown" if vms is None else await self.probe(manager, team_num, entry, vms)
+        if self.watched.get(key) is not entry:
+            return
+        if team is None:
+            if team_num not in manager.available_team_nums:
+                self.drop(key, entry)
+                return
+            self.set_state(guild_id, team_num, state)
+        elif state == "ready":
+            await self.notify_ready(manager, team)
+        
+        # A slot that isn't reverted won't be booted, so one look is enough
+        if state in ("ready", "unknown") or (team is None and key not in self.reverted) or time.monotonic() > entry["deadline"]:
+            self.drop(key, entry)
+    
+    async def probe(self, manager: GuildTeamManager, team_num: int, entry: dict, vms: Dict[int, dict]) -> str:
+        first, last = manager.settings.get_vmid_range(team_num)
+        # A free slot that wasn't reverted (after /reset, /reopen_team or a restart) may still hold the
+        # last team's changes, so it isn't booted and running VMs don't make it better than any other slot
+        dirty = entry["created"] is None and (manager.guild_id, team_num) not in self.reverted
+        if any(vms.get(vmid, {}).get("status") != "running" for vmid in range(first, last + 1)):
+            if entry["created"] is not None or entry["started"] or dirty:
+                return "stopped"
+            # Free slots are safe to boot, nobody is using them yet
+            entry["started"] = True
+            try:
+                await spam_client.start_range(first, last)
+            except Exception as e:
+                print(f"[Guild {manager.guild_id}] Error starting VMs of free slot {team_num}: {e}")
+                return "stopped"
+            return "started"
+        if dirty:
+            return "unknown"
+        
+        # Every VM runs, now wait for the guests; agents that answered once aren't asked again
+        async with self.probe_semaphore:
+            for vmid in range(first, last + 1):
+                if vmid in entry["agents"]:
+                    continue
+                if not await spam_client.agent_ready(vms[vmid]["node"], vmid):
+                    return "started"
+                entry["agents"].add(vmid)
+        return "ready"
+    
+    def drop(self, key: tuple, entry: dict):
+        if self.watched.get(key) is entry:
+            del self.watched[key]
+    
+    async def notify_ready(self, manager: GuildTeamManager, team: Team):
+        ready_embed = discord.Embed(
+            title=f"Team {team.team_num} - Environment Ready",
+            description=f"All {manager.settings.number_of_machines} VMs in your range are up.",
+            color=discord.Color.green()
+        )
+        ready_embed.add_field(name="IP Range", value=team.settings.get_ip(team.team_num), inline=False)
+        # The outbox key makes sure each team hears this once
+        await notify_team(manager, team, ready_embed, "env_ready")
+        timer_refresher.mark(team, "Environment ready")
+    
+    def describe(self, manager: GuildTeamManager) -> str:
+        counts = {}
+        for team_num in manager.available_team_nums:
+            state = self.state(manager.guild_id, team_num)
+            counts[state] = counts.get(state, 0) + 1
+        return ", ".join(f"{state} {counts[state]}" for state in WARM_STATES if state in counts) or "No free slots"
+
+class Histogram:
+    """Cumulative latency buckets in the Prometheus layout"""
+    def __init__(self):
+        # One count per bucket plus the +Inf bucket
+        self.counts = [0] * (len(METRIC_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+    
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(METRIC_BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+    
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th quantile"""
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(METRIC_BUCKETS, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+class Metrics:
+    """In-process counters and histograms, served as Prometheus text"""
+    def __init__(self):
+        # (name, sorted label pairs) -> value
+        self.histograms: Dict[tuple, Histogram] = {}
+        self.counters: Dict[tuple, float] = {}
+        self.runner: Optional[web.AppRunner] = None
+    
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(seconds)
+    
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + amount
+    
+    def collect_gauges(self) -> List[tuple]:
+        """Current sizes of the in-memory state, as (name, labels, value)"""
+        managers = list(multi_manager.guild_managers.values())
+        gauges = [
+            ("teambot_loaded_guilds", {}, len(managers)),
+            ("teambot_teams", {}, sum(len(manager.teams) for manager in managers)),
+            ("teambot_user_teams", {}, sum(len(manager.user_teams) for manager in managers)),
+            ("teambot_available_team_nums", {}, sum(len(manager.available_team_nums) for manager in managers)),
+            ("teambot_queued_users", {}, sum(len(manager.queue) for manager in managers)),
+            ("teambot_scheduled_deadlines", {}, len(scheduler.entries)),
+            ("teambot_outbox_pending", {}, len(outbox.pending))
+        ]
+        for state in ("queued", "running", "failed"):
+            gauges.append(("teambot_reset_jobs", {"state": state}, sum(1 for job in reset_jobs.jobs.values() if job["state"] == state)))
+        for state in WARM_STATES:
+            gauges.append(("teambot_warm_slots", {"state": state}, sum(1 for value in warm_pool.states.values() if value == state)))
+        for lane, stats in outbound.lane_stats.items():
+            gauges.append(("teambot_outbound_depth", {"lane": LANE_NAMES[lane]}, stats["depth"]))
+        return gauges
+    
+    def collect_counters(self) -> Dict[tuple, float]:
+        counters = dict(self.counters)
+        # The outbound scheduler keeps its own totals
+        for lane, stats in outbound.lane_stats.items():
+            for stat in ("submitted", "completed", "shed"):
+                counters[(f"teambot_outbound_{stat}_total", (("lane", LANE_NAMES[lane]),))] = stats[stat]
+        return counters
+    
+    def render(self) -> str:
+        def label_text(labels) -> str:
+            return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}" if labels else ""
+        
+        lines = []
+        typed = set()
+        def add_type(name: str, kind: str):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+        
+        for (name, labels), value in sorted(self.collect_counters().items()):
+            add_type(name, "counter")
+            lines.append(f"{name}{label_text(labels)} {value}")
+        
+        for name, labels, value in self.collect_gauges():
+            add_type(name, "gauge")
+            lines.append(f"{name}{label_text(sorted(labels.items()))} {value}")
+        
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            add_type(name, "histogram")
+            cumulative = 0
+            for bound, count in zip(METRIC_BUCKETS + ("+Inf",), histogram.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{label_text(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_sum{label_text(labels)} {histogram.total}")
+            lines.append(f"{name}_count{label_text(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+    
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.render(), content_type="text/plain", charset="utf-8")
+    
+    async def start_server(self):
+        if not METRICS_PORT or self.runner is not None:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle_metrics)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        try:
+            await web.TCPSite(self.runner, METRICS_HOST, METRICS_PORT).start()
+            print(f"Serving metrics on http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+        except OSError as e:
+            print(f"Couldn't start the metrics server: {e}")
+
+def instrumented(func):
+    """Record latency and errors of a slash command handler"""
+    @functools.wraps(func)
+    async def wrapper(interaction: discord.Interaction, *args, **kwargs):
+        command = interaction.command.name if interaction.command else func.__name__
+        start = time.monotonic()
+        try:
+            return await func(interaction, *args, **kwargs)
+        except Exception:
+            metrics.inc("teambot_command_errors_total", command=command)
+            raise
+        finally:
+            metrics.observe("teambot_command_seconds", time.monotonic() - start, command=command)
+    return wrapper
+
+storage = create_storage()
 multi_manager = MultiGuildManager()
+persistence = PersistenceWriter()
+scheduler = DeadlineScheduler()
+timer_refresher = TimerMessageRefresher()
+dm_channels = DMChannelCache()
+outbound = OutboundScheduler(DM_CONCURRENCY)
+dm_sender = DMSender()
+outbox = NotificationOutbox(DATA_DIR / "outbox.jsonl")
+admin_digest = AdminDigest()
+matchmaker = Matchmaker()
+metrics = Metrics()
+spam_client = SpamClient(SPAM_DIR)
+reset_jobs = ResetJobQueue(DATA_DIR / "reset_jobs.json")
+warm_pool = WarmPool()
 
-async def send_dm(user_id: int, content: str = None, embed: discord.Embed = None, view: discord.ui.View = None) -> tuple:
-    try:
-        user = await bot.fetch_user(user_id)
-        msg = await user.send(content=content, embed=embed, view=view)
-        return True, msg.channel.id, msg.id
-    except discord.Forbidden:
-        return False, None, None
+async def send_dm(user_id: int, content: str = None, embed: discord.Embed = None, view: discord.ui.View = None, lane: int = LANE_TEAM) -> tuple:
+    result = await dm_sender.send(user_id, content=content, embed=embed, view=view, lane=lane)
+    return result.sent, result.channel_id, result.message_id
+
+def notification_key(kind: str, guild_id: int, team: Team) -> str:
+    # The end time tells apart different teams that have used the same slot
+    return f"{kind}:{guild_id}:{team.team_num}:{int(team.end_time.timestamp())}"
+
+async def notify_team(manager: GuildTeamManager, team: Team, embed: discord.Embed, kind: str):
+    """Queue the notice for every member, admins hear about it in the next digest"""
+    await outbox.enqueue(notification_key(kind, manager.guild_id, team), list(team.members.keys()), embed=embed, lane=LANE_TEAM)
 
 async def create_timer_embed(team: Team):
+    if not team.is_active:
+        status = "Ended"
+    elif team.halfway_notified:
+        status = "Past the halfway point"
+    else:
+        status = "In progress"
+    
     embed = discord.Embed(
         title=f"Team {team.team_num} - Timer",
         description=f"**Ends at:** <t:{int(team.end_time.timestamp())}:R>",
-        color=discord.Color.blue()
+        color=discord.Color.blue() if team.is_active else discord.Color.red()
     )
-    embed.add_field(name="Team Members", value=", ".join(team.members.values()), inline=False)
+    embed.add_field(name="Status", value=status, inline=False)
+    embed.add_field(name="Captain", value=team.members.get(team.captain_id) or "None", inline=False)
+    embed.add_field(name="Team Members", value=", ".join(team.members.values()) or "None", inline=False)
     embed.add_field(name="IP Range", value=team.settings.get_ip(team.team_num), inline=False)
+    if team.last_update:
+        embed.add_field(name="Latest Update", value=team.last_update, inline=False)
     
     return embed
 
+async def add_member(manager: GuildTeamManager, team: Team, user_id: int, username: str) -> bool:
+    """Put a user on a team and DM them its timer; False if they couldn't be added"""
+    team.members[user_id] = username
+    manager.user_teams[user_id] = team.team_num
+    manager.queue.pop(user_id, None)
+    
+    timer_embed = await create_timer_embed(team)
+    dm_sent, channel_id, msg_id = await send_dm(user_id, embed=timer_embed, lane=LANE_JOIN_REQUEST)
+    
+    if not dm_sent or not team.is_active:
+        team.members.pop(user_id, None)
+        if manager.user_teams.get(user_id) == team.team_num:
+            del manager.user_teams[user_id]
+        return False
+    
+    if channel_id and msg_id:
+        team.timer_message_ids[user_id] = (channel_id, msg_id)
+    
+    # Journal the new member after they join
+    manager.record_event(
+        "member_joined",
+        team_num=team.team_num,
+        user_id=user_id,
+        username=username,
+        timer_message=team.timer_message_ids.get(user_id)
+    )
+    timer_refresher.mark(team, f"{username} joined the team")
+    return True
+
 async def end_team(guild_id: int, team_num: int, auto_end: bool = False):
     manager = multi_manager.get_manager(guild_id)
     
@@ -285,8 +2473,8 @@ async def end_team(guild_id: int, team_num: int, auto_end: bool = False):
         return
     
     team = manager.teams[team_num]
-    team.is_active = False
-    manager.closed_teams.add(team_num)
+    if not team.is_active:
+        return
     
     reason = "Time limit reached" if auto_end else "Captain ended the team"
     embed = discord.Embed(
@@ -296,67 +2484,29 @@ async def end_team(guild_id: int, team_num: int, auto_end: bool = False):
     )
     embed.add_field(name="Team Members", value=", ".join(team.members.values()), inline=False)
     
-    for member_id in list(team.members.keys()):
-        await send_dm(member_id, embed=embed)
-        if member_id in manager.user_teams:
-            del manager.user_teams[member_id]
-    
-    for admin_id in manager.admins:
-        await send_dm(admin_id, embed=embed)
-
-    # --- START: Subprocess Logic ---
-    try:
-        current_dir = pathlib.Path(__file__).parent.resolve()
-    except NameError:
-        current_dir = pathlib.Path.cwd()
+    team.is_active = False
+    manager.closed_teams.add(team_num)
+    scheduler.cancel_team(guild_id, team_num)
     
-    script_path = current_dir / "SPAM" / "status.py"
-    start_vmid_reset = manager.settings.start_vmid + (team_num - 1) * (manager.settings.number_of_machines)
-    end_vmid_reset = start_vmid_reset + (manager.settings.number_of_machines - 1)
+    start_vmid_reset, end_vmid_reset = manager.settings.get_vmid_range(team_num)
     
-    # Subprocess 1: --revert
-    try:
-        process = await asyncio.create_subprocess_exec(
-            sys.executable, str(script_path),
-            "--revert", "-r", 
-            str(start_vmid_reset), str(end_vmid_reset),
-            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-        )
-        stdout, stderr = await process.communicate()
-        if process.returncode != 0:
-            print(f"[Guild {guild_id}] Error (revert) status.py for team {team_num}: {stderr.decode()}")
-    except Exception as e:
-        print(f"[Guild {guild_id}] Failed to start subprocess (revert) for team {team_num}: {e}")
-
-    # Subprocess 2: -s
-    try:
-        process = await asyncio.create_subprocess_exec(
-            sys.executable, str(script_path),
-            "-s", "-r", 
-            str(start_vmid_reset), str(end_vmid_reset),
-            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-        )
-        stdout, stderr = await process.communicate()
-        if process.returncode != 0:
-            print(f"[Guild {guild_id}] Error (-s) status.py for team {team_num}: {stderr.decode()}")
-    except Exception as e:
-        print(f"[Guild {guild_id}] Failed to start subprocess (-s) for team {team_num}: {e}")
-    # --- END: Subprocess Logic ---
-
-    manager.closed_teams.remove(team_num)
-    manager.available_team_nums.add(team_num)
-    del manager.teams[team_num]
+    # The notice and the reset job are both queued before the close is journaled,
+    # so a restart in between can't lose either. The slot stays closed until the job frees it
+    await notify_team(manager, team, embed, "team_closed")
+    await reset_jobs.submit(guild_id, team, start_vmid_reset, end_vmid_reset, reason)
+    manager.record_event("team_closed", team_num=team_num)
+    timer_refresher.mark(team, reason)
     
-    # Save state after team ends
-    manager.save_teams()
-
+    for member_id in list(team.members.keys()):
+        if member_id in manager.user_teams:
+            del manager.user_teams[member_id]
 
 @bot.event
 async def on_ready():
     print(f"Bot logged in as {bot.user}")
     
-    # Load all saved guild data
-    multi_manager.load_all_guilds()
+    # Load guilds with running teams, everything else loads on first use
+    multi_manager.load_deadline_guilds()
     
     try:
         synced = await bot.tree.sync()
@@ -364,48 +2514,47 @@ async def on_ready():
     except Exception as e:
         print(e)
     
-    start_timer_updates.start()
-    auto_save_task.start()
+    # Deadlines are rebuilt from the persisted end times of the loaded teams
+    scheduler.rebuild()
+    scheduler.start()
+    
+    if not auto_save_task.is_running():
+        auto_save_task.start()
+    if not evict_idle_guilds.is_running():
+        evict_idle_guilds.start()
 
-@tasks.loop(seconds=10)
-async def start_timer_updates():
-    for guild_id, manager in list(multi_manager.guild_managers.items()):
-        for team_num, team in list(manager.teams.items()):
-            if not team.is_active:
-                continue
-            
-            time_left = team.end_time - datetime.now()
-            
-            if time_left.total_seconds() <= 0:
-                await end_team(guild_id, team_num, auto_end=True)
-                continue
-            
-            total_seconds = team.settings.duration_minutes * 60
-            if not team.halfway_notified and time_left.total_seconds() <= total_seconds / 2:
-                team.halfway_notified = True
-                halfway_embed = discord.Embed(
-                    title=f"Team {team.team_num} - Halfway Point Reached!",
-                    description="Your team has reached the halfway mark.",
-                    color=discord.Color.orange()
-                )
-                for member_id in team.members.keys():
-                    await send_dm(member_id, embed=halfway_embed)
-                
-                for admin_id in manager.admins:
-                    await send_dm(admin_id, embed=halfway_embed)
-                
-                # Save state after halfway notification
-                manager.save_teams()
+async def notify_halfway(guild_id: int, team_num: int):
+    manager = multi_manager.get_manager(guild_id)
+    team = manager.teams.get(team_num)
+    if team is None or not team.is_active or team.halfway_notified:
+        return
+    
+    halfway_embed = discord.Embed(
+        title=f"Team {team.team_num} - Halfway Point Reached!",
+        description="Your team has reached the halfway mark.",
+        color=discord.Color.orange()
+    )
+    # Queued before the flag is journaled, so a restart in between can't lose the notice
+    await notify_team(manager, team, halfway_embed, "halfway")
+    admin_digest.add(guild_id, "halfway", f"Team {team_num}")
+    team.halfway_notified = True
+    
+    # Journal the halfway notification
+    manager.record_event("halfway_notified", team_num=team_num)
+    timer_refresher.mark(team, "Halfway point reached")
 
-@tasks.loop(minutes=5)
+@tasks.loop(seconds=FLUSH_INTERVAL_SECONDS)
 async def auto_save_task():
-    """Automatically save data every 5 minutes"""
-    for guild_id, manager in multi_manager.guild_managers.items():
-        manager.save_teams()
-    print("Auto-save completed for all guilds")
+    """Flush guilds that changed since the last run"""
+    await persistence.flush()
+
+@tasks.loop(minutes=1)
+async def evict_idle_guilds():
+    multi_manager.evict_idle()
 
 @bot.tree.command(name="admin_add", description="Administrator command to add new admins (Admin only)")
 @app_commands.describe(user="The user to make an admin")
+@instrumented
 async def admin_add(interaction: discord.Interaction, user: discord.User):
     manager = multi_manager.get_manager(interaction.guild_id)
     
@@ -419,6 +2568,7 @@ async def admin_add(interaction: discord.Interaction, user: discord.User):
 
 @bot.tree.command(name="admin_remove", description="Administrator command to remove admins (Admin only)")
 @app_commands.describe(user="The user to remove as an admin")
+@instrumented
 async def admin_remove(interaction: discord.Interaction, user: discord.User):
     manager = multi_manager.get_manager(interaction.guild_id)
     
@@ -436,6 +2586,7 @@ async def admin_remove(interaction: discord.Interaction, user: discord.User):
 
 @bot.tree.command(name="admin_settings", description="Configure team settings (Admin only)")
 @app_commands.describe(max_size="Max team size", max_teams="Max number of teams", duration="Duration in minutes", ip_base="IP range base (e.g., 10.10.x.10)", start_vmid="VMID of first machine cloned", number_of_machines="Number of machines per network")
+@instrumented
 async def admin_settings(interaction: discord.Interaction, max_size: int = None, max_teams: int = None, duration: int = None, ip_base: str = None, start_vmid: int = None, number_of_machines: int = None):
     manager = multi_manager.get_manager(interaction.guild_id)
     
@@ -449,6 +2600,8 @@ async def admin_settings(interaction: discord.Interaction, max_size: int = None,
         manager.update_max_teams(max_teams)
     if duration:
         manager.settings.duration_minutes = duration
+        # The halfway point is measured against the current duration
+        scheduler.reschedule_guild(interaction.guild_id)
     if ip_base:
         manager.settings.ip_base = ip_base
     if start_vmid:
@@ -465,6 +2618,7 @@ async def admin_settings(interaction: discord.Interaction, max_size: int = None,
     )
 
 @bot.tree.command(name="view_settings", description="View current team settings (Admin only)")
+@instrumented
 async def view_settings(interaction: discord.Interaction):
     manager = multi_manager.get_manager(interaction.guild_id)
     
@@ -480,6 +2634,8 @@ async def view_settings(interaction: discord.Interaction):
     embed.add_field(name="Active Teams", value=str(len(manager.teams)), inline=False)
     embed.add_field(name="Available Team Numbers", value=str(len(manager.available_team_nums)), inline=False)
     embed.add_field(name="Closed Teams", value=str(sorted(manager.closed_teams)), inline=False)
+    embed.add_field(name="Warm Slots", value=warm_pool.describe(manager), inline=False)
+    embed.add_field(name="Outbound Queue", value=outbound.describe(), inline=False)
     
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
@@ -492,22 +2648,13 @@ class RequestMoreTeamsView(discord.ui.View):
     
     @discord.ui.button(label="Request More Teams", style=discord.ButtonStyle.danger)
     async def request_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        manager = multi_manager.get_manager(self.guild_id)
-        
-        embed = discord.Embed(
-            title="Team Creation Request",
-            description=f"{self.username} has requested more teams to be created.",
-            color=discord.Color.orange()
-        )
-        embed.add_field(name="User ID", value=str(self.user_id), inline=False)
-        embed.add_field(name="Reason", value="All teams are currently full", inline=False)
-        
-        for admin_id in manager.admins:
-            await send_dm(admin_id, embed=embed)
+        # Repeated clicks within a digest window show up once
+        admin_digest.add(self.guild_id, "more_teams", f"{self.username} (<@{self.user_id}>)")
         
         await interaction.response.send_message("Request sent to admins!", ephemeral=True)
 
 @bot.tree.command(name="create_team", description="Create a new team")
+@instrumented
 async def create_team(interaction: discord.Interaction):
     await interaction.response.defer(ephemeral=True)
     
@@ -515,100 +2662,143 @@ async def create_team(interaction: discord.Interaction):
     user_id = interaction.user.id
     
     if user_id in manager.user_teams:
-        await interaction.followup.send("You're already in a team! Leave your current team first.", ephemeral=True)
+        await followup(interaction, "You're already in a team! Leave your current team first.", ephemeral=True)
         return
     
-    if not manager.available_team_nums:
+    team_num = manager.allocate_team_num()
+    if team_num is None:
         view = RequestMoreTeamsView(user_id, interaction.user.name, interaction.guild_id)
-        await interaction.followup.send("All teams are currently full! Would you like to request more teams?", view=view, ephemeral=True)
+        await followup(interaction, "All teams are currently full! Would you like to request more teams?", view=view, ephemeral=True)
         return
     
-    if len(manager.teams) >= manager.settings.max_teams:
-        view = RequestMoreTeamsView(user_id, interaction.user.name, interaction.guild_id)
-        await interaction.followup.send("All teams are currently full! Would you like to request more teams?", view=view, ephemeral=True)
-        return
-    
-    team_num = min(manager.available_team_nums)
-    manager.available_team_nums.remove(team_num)
-    
     team = Team(team_num, user_id, manager.settings)
     manager.teams[team_num] = team
     manager.user_teams[user_id] = team_num
+    manager.queue.pop(user_id, None)
     
     team.members[user_id] = interaction.user.name
     
     timer_embed = await create_timer_embed(team)
-    dm_sent, channel_id, msg_id = await send_dm(user_id, embed=timer_embed)
+    dm_sent, channel_id, msg_id = await send_dm(user_id, embed=timer_embed, lane=LANE_JOIN_REQUEST)
     
     if not dm_sent:
-        await interaction.followup.send("I couldn't DM you! Please enable DMs from server members and try again.", ephemeral=True)
+        await followup(interaction, "I couldn't DM you! Please enable DMs from server members and try again.", ephemeral=True)
         del manager.teams[team_num]
         del manager.user_teams[user_id]
         manager.available_team_nums.add(team_num)
+        warm_pool.warm(interaction.guild_id, team_num)
         return
     
     if channel_id and msg_id:
         team.timer_message_ids[user_id] = (channel_id, msg_id)
     
-    # Save state after team creation
-    manager.save_teams()
+    # Journal the new team after creation
+    manager.record_event("team_created", team=team.to_dict())
+    scheduler.schedule_team(interaction.guild_id, team)
+    warm_pool.track_team(interaction.guild_id, team)
     
-    await interaction.followup.send(f"Team {team_num} created! Check your DMs for details.", ephemeral=True)
+    await followup(interaction, f"Team {team_num} created! Check your DMs for details.", ephemeral=True)
 
-class JoinRequestView(discord.ui.View):
-    def __init__(self, user_id: int, username: str, team_num: int, guild_id: int):
-        super().__init__(timeout=300)
-        self.user_id = user_id
-        self.username = username
-        self.team_num = team_num
+async def resolve_username(user_id: int) -> str:
+    """Look a user's name up in the cache, falling back to the API"""
+    user = bot.get_user(user_id)
+    if user is None:
+        try:
+            user = await bot.fetch_user(user_id)
+        except discord.HTTPException:
+            return str(user_id)
+    return user.name
+
+def get_request_team(manager: GuildTeamManager, team_num: int, created: int) -> Optional[Team]:
+    """The team a join request was made for, or None if that team has since ended"""
+    team = manager.teams.get(team_num)
+    # The end time tells the requested team apart from a later team in the same slot
+    if team is None or not team.is_active or int(team.end_time.timestamp()) != created:
+        return None
+    return team
+
+class JoinApproveButton(discord.ui.DynamicItem[discord.ui.Button], template=r"join_approve:(?P<guild_id>\d+):(?P<team_num>\d+):(?P<created>\d+):(?P<user_id>\d+)"):
+    """Captain's approve button, everything it needs lives in the custom_id so it survives restarts"""
+    def __init__(self, guild_id: int, team_num: int, created: int, user_id: int):
+        super().__init__(discord.ui.Button(
+            label="Approve",
+            style=discord.ButtonStyle.success,
+            custom_id=f"join_approve:{guild_id}:{team_num}:{created}:{user_id}"
+        ))
         self.guild_id = guild_id
+        self.team_num = team_num
+        self.created = created
+        self.user_id = user_id
+    
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(int(match["guild_id"]), int(match["team_num"]), int(match["created"]), int(match["user_id"]))
     
-    @discord.ui.button(label="Approve", style=discord.ButtonStyle.success)
-    async def approve_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+    async def callback(self, interaction: discord.Interaction):
+        # The name lookup and DMs can outlast the interaction's 3 second window
+        await interaction.response.defer(ephemeral=True)
         manager = multi_manager.get_manager(self.guild_id)
+        team = get_request_team(manager, self.team_num, self.created)
         
-        if interaction.user.id != manager.teams[self.team_num].captain_id:
-            await interaction.response.send_message("Only the team captain can approve join requests.", ephemeral=True)
+        if team is None:
+            await followup(interaction, "That team has already ended.", ephemeral=True)
             return
         
-        team = manager.teams[self.team_num]
-        if len(team.members) >= manager.settings.max_team_size:
-            await interaction.response.send_message("That team is now full!", ephemeral=True)
+        if interaction.user.id != team.captain_id:
+            await followup(interaction, "Only the team captain can approve join requests.", ephemeral=True)
             return
         
-        team.members[self.user_id] = self.username
-        manager.user_teams[self.user_id] = self.team_num
-        
-        timer_embed = await create_timer_embed(team)
-        dm_sent, channel_id, msg_id = await send_dm(self.user_id, embed=timer_embed)
+        if self.user_id in manager.user_teams:
+            await followup(interaction, "That user is already in a team.", ephemeral=True)
+            return
         
-        if not dm_sent:
-            await interaction.response.send_message("Couldn't send DM to user. They may have DMs disabled.", ephemeral=True)
-            del team.members[self.user_id]
-            del manager.user_teams[self.user_id]
+        if len(team.members) >= manager.settings.max_team_size:
+            await followup(interaction, "That team is now full!", ephemeral=True)
             return
         
-        if channel_id and msg_id:
-            team.timer_message_ids[self.user_id] = (channel_id, msg_id)
+        username = await resolve_username(self.user_id)
+        if not await add_member(manager, team, self.user_id, username):
+            await followup(interaction, "Couldn't send DM to user. They may have DMs disabled.", ephemeral=True)
+            return
         
         approved_embed = discord.Embed(
             title=f"Approved to Join Team {self.team_num}!",
             description="The team captain has approved your join request.",
             color=discord.Color.green()
         )
-        await send_dm(self.user_id, embed=approved_embed)
-        
-        # Save state after member joins
-        manager.save_teams()
+        await send_dm(self.user_id, embed=approved_embed, lane=LANE_JOIN_REQUEST)
         
-        await interaction.response.send_message(f"Approved {self.username} to join Team {self.team_num}!", ephemeral=True)
+        await followup(interaction, f"Approved {username} to join Team {self.team_num}!", ephemeral=True)
+
+class JoinDenyButton(discord.ui.DynamicItem[discord.ui.Button], template=r"join_deny:(?P<guild_id>\d+):(?P<team_num>\d+):(?P<created>\d+):(?P<user_id>\d+)"):
+    """Captain's deny button, the counterpart of JoinApproveButton"""
+    def __init__(self, guild_id: int, team_num: int, created: int, user_id: int):
+        super().__init__(discord.ui.Button(
+            label="Deny",
+            style=discord.ButtonStyle.danger,
+            custom_id=f"join_deny:{guild_id}:{team_num}:{created}:{user_id}"
+        ))
+        self.guild_id = guild_id
+        self.team_num = team_num
+        self.created = created
+        self.user_id = user_id
     
-    @discord.ui.button(label="Deny", style=discord.ButtonStyle.danger)
-    async def deny_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(int(match["guild_id"]), int(match["team_num"]), int(match["created"]), int(match["user_id"]))
+    
+    async def callback(self, interaction: discord.Interaction):
+        # The name lookup and DMs can outlast the interaction's 3 second window
+        await interaction.response.defer(ephemeral=True)
         manager = multi_manager.get_manager(self.guild_id)
+        team = get_request_team(manager, self.team_num, self.created)
+        
+        if team is None:
+            await followup(interaction, "That team has already ended.", ephemeral=True)
+            return
         
-        if interaction.user.id != manager.teams[self.team_num].captain_id:
-            await interaction.response.send_message("Only the team captain can deny join requests.", ephemeral=True)
+        if interaction.user.id != team.captain_id:
+            await followup(interaction, "Only the team captain can deny join requests.", ephemeral=True)
             return
         
         denied_embed = discord.Embed(
@@ -616,59 +2806,140 @@ class JoinRequestView(discord.ui.View):
             description="The team captain has denied your join request.",
             color=discord.Color.red()
         )
-        await send_dm(self.user_id, embed=denied_embed)
+        await send_dm(self.user_id, embed=denied_embed, lane=LANE_JOIN_REQUEST)
         
-        await interaction.response.send_message(f"Denied {self.username}'s join request.", ephemeral=True)
+        username = await resolve_username(self.user_id)
+        await followup(interaction, f"Denied {username}'s join request.", ephemeral=True)
 
-class JoinTeamButtonView(discord.ui.View):
-    def __init__(self, user_id: int, username: str, guild_id: int):
-        super().__init__(timeout=300)
-        self.user_id = user_id
-        self.username = username
-        self.guild_id = guild_id
+async def request_to_join(interaction: discord.Interaction, guild_id: int, team_num: int, created: int):
+    """Send the clicking user's join request to the captain of the chosen team"""
+    await interaction.response.defer(ephemeral=True)
+    manager = multi_manager.get_manager(guild_id)
+    team = get_request_team(manager, team_num, created)
+    user_id = interaction.user.id
     
-    async def create_team_buttons(self):
-        manager = multi_manager.get_manager(self.guild_id)
-        
-        for team_num, team in sorted(manager.teams.items()):
-            if len(team.members) < manager.settings.max_team_size and team.is_active:
-                button = discord.ui.Button(
-                    label=f"Team {team_num} ({len(team.members)}/{manager.settings.max_team_size})",
-                    style=discord.ButtonStyle.primary
-                )
-                button.callback = lambda i, tn=team_num: self.join_callback(i, tn)
-                self.add_item(button)
+    if team is None:
+        await followup(interaction, "That team no longer exists.", ephemeral=True)
+        return
     
-    async def join_callback(self, interaction: discord.Interaction, team_num: int):
-        manager = multi_manager.get_manager(self.guild_id)
-        
-        if team_num not in manager.teams:
-            await interaction.response.send_message("That team no longer exists.", ephemeral=True)
+    if user_id in manager.user_teams:
+        await followup(interaction, "You're already in a team! Leave first using `/leave_team`.", ephemeral=True)
+        return
+    
+    if len(team.members) >= manager.settings.max_team_size:
+        await followup(interaction, "That team is now full!", ephemeral=True)
+        return
+    
+    if team.auto_accept:
+        # The captain takes anyone, so skip the request round trip
+        if not await add_member(manager, team, user_id, interaction.user.name):
+            await followup(interaction, "I couldn't DM you! Please enable DMs from server members and try again.", ephemeral=True)
             return
-        
+        await followup(interaction, f"Joined Team {team_num}! Check your DMs for details.", ephemeral=True)
+        return
+    
+    request_view = discord.ui.View(timeout=None)
+    request_view.add_item(JoinApproveButton(guild_id, team_num, created, user_id))
+    request_view.add_item(JoinDenyButton(guild_id, team_num, created, user_id))
+    
+    request_embed = discord.Embed(
+        title=f"Join Request for Team {team_num}",
+        description=f"{interaction.user.name} has requested to join your team.",
+        color=discord.Color.yellow()
+    )
+    request_embed.add_field(name="Requested User ID", value=str(user_id), inline=False)
+    
+    captain_dm_sent, _, _ = await send_dm(team.captain_id, embed=request_embed, view=request_view, lane=LANE_JOIN_REQUEST)
+    # Clicks are routed by the registered dynamic items, the view itself doesn't need to be kept
+    request_view.stop()
+    
+    if not captain_dm_sent:
+        await followup(interaction, "Couldn't send join request to captain. Captain may have DMs disabled.", ephemeral=True)
+        return
+    
+    await followup(interaction, f"Join request sent to Team {team_num} captain! They will review your request.", ephemeral=True)
+
+def render_join_page(manager: GuildTeamManager, order: str, page: int) -> tuple:
+    """Embed and view for one page of joinable teams, or (None, None) if there are none"""
+    team_nums, total = manager.joinable_page(order, page, JOIN_PAGE_SIZE)
+    if not total:
+        return None, None
+    page_count = (total + JOIN_PAGE_SIZE - 1) // JOIN_PAGE_SIZE
+    if not team_nums:
+        # Teams filled up since the page was rendered, show the last page instead
+        page = page_count - 1
+        team_nums, total = manager.joinable_page(order, page, JOIN_PAGE_SIZE)
+    
+    info_embed = discord.Embed(title="Available Teams", color=discord.Color.blue())
+    info_embed.set_footer(text=f"Page {page + 1}/{page_count} - {total} team(s) open")
+    options = []
+    for team_num in team_nums:
         team = manager.teams[team_num]
-        if len(team.members) >= manager.settings.max_team_size:
-            await interaction.response.send_message("That team is now full!", ephemeral=True)
-            return
-        
-        request_view = JoinRequestView(self.user_id, self.username, team_num, self.guild_id)
-        
-        request_embed = discord.Embed(
-            title=f"Join Request for Team {team_num}",
-            description=f"{self.username} has requested to join your team.",
-            color=discord.Color.yellow()
+        time_left = team.end_time - datetime.now()
+        mins, secs = divmod(int(time_left.total_seconds()), 60)
+        info_embed.add_field(
+            name=f"Team {team_num}",
+            value=f"**Members:** {len(team.members)}/{manager.settings.max_team_size}\n**Time Left:** {mins}m {secs}s\n**Members:** {', '.join(list(team.members.values())[:3])}{'...' if len(team.members) > 3 else ''}",
+            inline=False
         )
-        request_embed.add_field(name="Requested User ID", value=str(self.user_id), inline=False)
-        
-        captain_dm_sent, _, _ = await send_dm(team.captain_id, embed=request_embed, view=request_view)
-        
-        if not captain_dm_sent:
-            await interaction.response.send_message("Couldn't send join request to captain. Captain may have DMs disabled.", ephemeral=True)
+        options.append(discord.SelectOption(
+            label=f"Team {team_num} ({len(team.members)}/{manager.settings.max_team_size})",
+            value=f"{team_num}:{int(team.end_time.timestamp())}"
+        ))
+    
+    view = discord.ui.View(timeout=None)
+    view.add_item(JoinTeamSelect(manager.guild_id, order, page, options))
+    view.add_item(JoinPageButton(manager.guild_id, order, max(page - 1, 0), "Previous", disabled=page == 0))
+    view.add_item(JoinPageButton(manager.guild_id, order, page + 1, "Next", disabled=page + 1 >= page_count))
+    return info_embed, view
+
+class JoinTeamSelect(discord.ui.DynamicItem[discord.ui.Select], template=r"join_select:(?P<guild_id>\d+):(?P<order>\w+):(?P<page>\d+)"):
+    """Team picker in /join_team, the requester is whoever picks a team"""
+    def __init__(self, guild_id: int, order: str, page: int, options: List[discord.SelectOption] = None):
+        super().__init__(discord.ui.Select(
+            placeholder="Choose a team to join",
+            options=options or [discord.SelectOption(label="No teams", value="0:0")],
+            custom_id=f"join_select:{guild_id}:{order}:{page}"
+        ))
+        self.guild_id = guild_id
+    
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Select, match):
+        return cls(int(match["guild_id"]), match["order"], int(match["page"]))
+    
+    async def callback(self, interaction: discord.Interaction):
+        team_num, created = (int(part) for part in interaction.data["values"][0].split(":"))
+        await request_to_join(interaction, self.guild_id, team_num, created)
+
+class JoinPageButton(discord.ui.DynamicItem[discord.ui.Button], template=r"join_page:(?P<guild_id>\d+):(?P<order>\w+):(?P<page>\d+)"):
+    """Previous/next page button in /join_team"""
+    def __init__(self, guild_id: int, order: str, page: int, label: str = "Page", disabled: bool = False):
+        super().__init__(discord.ui.Button(
+            label=label,
+            style=discord.ButtonStyle.secondary,
+            disabled=disabled,
+            custom_id=f"join_page:{guild_id}:{order}:{page}"
+        ))
+        self.guild_id = guild_id
+        self.order = order
+        self.page = page
+    
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(int(match["guild_id"]), match["order"], int(match["page"]))
+    
+    async def callback(self, interaction: discord.Interaction):
+        manager = multi_manager.get_manager(self.guild_id)
+        info_embed, view = render_join_page(manager, self.order, self.page)
+        if info_embed is None:
+            await interaction.response.edit_message(content="No teams available to join at this moment. Try creating one with `/create_team`!", embed=None, view=None)
             return
         
-        await interaction.response.send_message(f"Join request sent to Team {team_num} captain! They will review your request.", ephemeral=True)
+        await interaction.response.edit_message(embed=info_embed, view=view)
+        view.stop()
 
 @bot.tree.command(name="reset", description="Reset all teams (Admin only)")
+@instrumented
 async def reset_teams(interaction: discord.Interaction):
     manager = multi_manager.get_manager(interaction.guild_id)
     
@@ -685,57 +2956,60 @@ async def reset_teams(interaction: discord.Interaction):
             description="All teams have been reset by an administrator.",
             color=discord.Color.red()
         )
+        await outbox.enqueue(notification_key("reset", interaction.guild_id, team), list(team.members.keys()), embed=reset_embed)
         for member_id in team.members.keys():
-            await send_dm(member_id, embed=reset_embed)
             if member_id in manager.user_teams:
                 del manager.user_teams[member_id]
+        team.is_active = False
+        timer_refresher.mark(team, "Reset by an administrator")
     
-    # Clear all teams and reopen them
+    # Clear all teams and reopen them. Queued VM resets are dropped so they can't hit the next teams,
+    # slots with a reset already running aren't handed out until it finishes
+    reset_jobs.cancel_slots(interaction.guild_id)
+    scheduler.cancel_guild(interaction.guild_id)
     manager.teams.clear()
     manager.closed_teams.clear()
     manager.available_team_nums = set(range(1, manager.settings.max_teams + 1))
     
-    # Save state after reset
-    manager.save_teams()
+    # Journal the reset
+    manager.record_event("teams_reset", max_teams=manager.settings.max_teams)
+    # Forget what was known about the old slots and check them all again
+    warm_pool.release_guild(interaction.guild_id)
+    warm_pool.warm_guild(manager)
     
-    await interaction.followup.send("All teams have been reset and reopened!", ephemeral=True)
+    await followup(interaction, "All teams have been reset and reopened!", ephemeral=True)
 
 @bot.tree.command(name="join_team", description="Join an existing team")
-async def join_team(interaction: discord.Interaction):
+@app_commands.describe(order="List teams by number or with the emptiest teams first")
+@app_commands.choices(order=[
+    app_commands.Choice(name="Team number", value="number"),
+    app_commands.Choice(name="Most space", value="space")
+])
+@instrumented
+async def join_team(interaction: discord.Interaction, order: str = "number"):
     await interaction.response.defer(ephemeral=True)
     
     manager = multi_manager.get_manager(interaction.guild_id)
     user_id = interaction.user.id
     
     if user_id in manager.user_teams:
-        await interaction.followup.send("You're already in a team! Leave first using `/leave_team`.", ephemeral=True)
+        await followup(interaction, "You're already in a team! Leave first using `/leave_team`.", ephemeral=True)
         return
     
     if not manager.teams:
-        await interaction.followup.send("No teams available. Try creating one with `/create_team`!", ephemeral=True)
+        await followup(interaction, "No teams available. Try creating one with `/create_team`!", ephemeral=True)
         return
     
-    view = JoinTeamButtonView(user_id, interaction.user.name, interaction.guild_id)
-    await view.create_team_buttons()
-    
-    if not view.children:
-        await interaction.followup.send("No teams available to join at this moment. Try creating one with `/create_team`!", ephemeral=True)
+    info_embed, view = render_join_page(manager, order, 0)
+    if info_embed is None:
+        await followup(interaction, "No teams available to join at this moment. Try creating one with `/create_team`!", ephemeral=True)
         return
     
-    info_embed = discord.Embed(title="Available Teams", color=discord.Color.blue())
-    for team_num, team in sorted(manager.teams.items()):
-        if len(team.members) < manager.settings.max_team_size and team.is_active:
-            time_left = team.end_time - datetime.now()
-            mins, secs = divmod(int(time_left.total_seconds()), 60)
-            info_embed.add_field(
-                name=f"Team {team_num}",
-                value=f"**Members:** {len(team.members)}/{manager.settings.max_team_size}\n**Time Left:** {mins}m {secs}s\n**Members:** {', '.join(list(team.members.values())[:3])}{'...' if len(team.members) > 3 else ''}",
-                inline=False
-            )
-    
-    await interaction.followup.send(embed=info_embed, view=view, ephemeral=True)
+    await followup(interaction, embed=info_embed, view=view, ephemeral=True)
+    view.stop()
 
 @bot.tree.command(name="leave_team", description="Leave your current team")
+@instrumented
 async def leave_team(interaction: discord.Interaction):
     await interaction.response.defer(ephemeral=True)
     
@@ -743,7 +3017,7 @@ async def leave_team(interaction: discord.Interaction):
     user_id = interaction.user.id
     
     if user_id not in manager.user_teams:
-        await interaction.followup.send("You're not in a team!", ephemeral=True)
+        await followup(interaction, "You're not in a team!", ephemeral=True)
         return
     
     team_num = manager.user_teams[user_id]
@@ -752,6 +3026,8 @@ async def leave_team(interaction: discord.Interaction):
     
     del team.members[user_id]
     del manager.user_teams[user_id]
+    team.timer_message_ids.pop(user_id, None)
+    manager.record_event("member_left", team_num=team_num, user_id=user_id)
     
     leave_embed = discord.Embed(
         title=f"Left Team {team_num}",
@@ -765,6 +3041,7 @@ async def leave_team(interaction: discord.Interaction):
     else:
         if user_id == team.captain_id:
             team.captain_id = list(team.members.keys())[0]
+            manager.record_event("captain_changed", team_num=team_num, captain_id=team.captain_id)
             new_captain_embed = discord.Embed(
                 title=f"You are now captain of Team {team_num}",
                 description="The previous captain has left the team.",
@@ -772,20 +3049,62 @@ async def leave_team(interaction: discord.Interaction):
             )
             await send_dm(team.captain_id, embed=new_captain_embed)
         
-        for member_id in team.members.keys():
-            member_left_embed = discord.Embed(
-                title=f"Member Left Team {team_num}",
-                description=f"{username} has left the team.",
-                color=discord.Color.gold()
-            )
-            await send_dm(member_id, embed=member_left_embed)
-        
-        # Save state after member leaves
-        manager.save_teams()
+        # Remaining members see the change on their timer message instead of a new DM
+        timer_refresher.mark(team, f"{username} left the team")
     
-    await interaction.followup.send(f"Left Team {team_num}.", ephemeral=True)
+    await followup(interaction, f"Left Team {team_num}.", ephemeral=True)
+
+@bot.tree.command(name="queue", description="Wait to be placed on a team automatically")
+@instrumented
+async def queue_command(interaction: discord.Interaction):
+    manager = multi_manager.get_manager(interaction.guild_id)
+    user_id = interaction.user.id
+    
+    if user_id in manager.user_teams:
+        await interaction.response.send_message("You're already in a team! Leave first using `/leave_team`.", ephemeral=True)
+        return
+    
+    if user_id not in manager.queue:
+        manager.queue[user_id] = interaction.user.name
+        matchmaker.kick(interaction.guild_id)
+    
+    position = list(manager.queue).index(user_id) + 1
+    await interaction.response.send_message(f"You're #{position} in the queue. You'll get a DM as soon as you're placed on a team.", ephemeral=True)
+
+@bot.tree.command(name="leave_queue", description="Stop waiting to be placed on a team")
+@instrumented
+async def leave_queue(interaction: discord.Interaction):
+    manager = multi_manager.get_manager(interaction.guild_id)
+    
+    if manager.queue.pop(interaction.user.id, None) is None:
+        await interaction.response.send_message("You're not in the queue.", ephemeral=True)
+        return
+    
+    await interaction.response.send_message("You've left the queue.", ephemeral=True)
+
+@bot.tree.command(name="auto_accept", description="Let anyone join your team without approval (Captain only)")
+@app_commands.describe(enabled="Accept join requests and queued users automatically")
+@instrumented
+async def auto_accept(interaction: discord.Interaction, enabled: bool):
+    manager = multi_manager.get_manager(interaction.guild_id)
+    user_id = interaction.user.id
+    
+    team_num = manager.user_teams.get(user_id)
+    if team_num is None or manager.teams[team_num].captain_id != user_id:
+        await interaction.response.send_message("Only a team captain can use this command.", ephemeral=True)
+        return
+    
+    team = manager.teams[team_num]
+    team.auto_accept = enabled
+    manager.record_event("auto_accept_changed", team_num=team_num, auto_accept=enabled)
+    
+    if enabled:
+        await interaction.response.send_message(f"Team {team_num} now accepts new members automatically.", ephemeral=True)
+    else:
+        await interaction.response.send_message(f"Join requests for Team {team_num} need your approval again.", ephemeral=True)
 
 @bot.tree.command(name="end_team", description="End your team as captain")
+@instrumented
 async def end_team_command(interaction: discord.Interaction):
     await interaction.response.defer(ephemeral=True)
     
@@ -793,21 +3112,22 @@ async def end_team_command(interaction: discord.Interaction):
     user_id = interaction.user.id
     
     if user_id not in manager.user_teams:
-        await interaction.followup.send("You're not in a team!", ephemeral=True)
+        await followup(interaction, "You're not in a team!", ephemeral=True)
         return
     
     team_num = manager.user_teams[user_id]
     team = manager.teams[team_num]
     
     if user_id != team.captain_id:
-        await interaction.followup.send("Only the team captain can end the team!", ephemeral=True)
+        await followup(interaction, "Only the team captain can end the team!", ephemeral=True)
         return
     
     await end_team(interaction.guild_id, team_num)
-    await interaction.followup.send(f"Team {team_num} has been ended.", ephemeral=True)
+    await followup(interaction, f"Team {team_num} has been ended.", ephemeral=True)
 
 @bot.tree.command(name="reopen_team", description="Reopen a closed team (Admin only)")
 @app_commands.describe(team_num="The team number to reopen")
+@instrumented
 async def reopen_team(interaction: discord.Interaction, team_num: int):
     manager = multi_manager.get_manager(interaction.guild_id)
     
@@ -819,15 +3139,91 @@ async def reopen_team(interaction: discord.Interaction, team_num: int):
         await interaction.response.send_message("That team is not closed or doesn't exist.", ephemeral=True)
         return
     
+    if team_num in reset_jobs.running_slots(interaction.guild_id):
+        await interaction.response.send_message(f"Team {team_num}'s VMs are being reset right now, it will reopen on its own when that finishes.", ephemeral=True)
+        return
+    
+    # A queued reset would otherwise revert the VMs of whoever takes the slot next
+    reset_jobs.cancel_slots(interaction.guild_id, {team_num})
     manager.closed_teams.remove(team_num)
     manager.available_team_nums.add(team_num)
+    # The ended team was kept while its VMs were being reset
+    if team_num in manager.teams and not manager.teams[team_num].is_active:
+        del manager.teams[team_num]
     
-    # Save state after reopening team
-    manager.save_teams()
+    # Journal the reopened slot
+    manager.record_event("slot_reopened", team_num=team_num)
+    warm_pool.warm(interaction.guild_id, team_num)
     
     await interaction.response.send_message(f"Team {team_num} has been reopened.", ephemeral=True)
 
+@bot.tree.command(name="reset_queue", description="Show queued, running and failed VM resets (Admin only)")
+@instrumented
+async def reset_queue(interaction: discord.Interaction):
+    manager = multi_manager.get_manager(interaction.guild_id)
+    
+    if interaction.user.id not in manager.admins and interaction.user.id != interaction.guild.owner_id:
+        await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
+        return
+    
+    embed = discord.Embed(title="VM Reset Queue", color=discord.Color.blue())
+    guild_jobs = sorted(
+        (job for job in reset_jobs.jobs.values() if job["guild_id"] == interaction.guild_id),
+        key=lambda job: job["queued_at"]
+    )
+    for state, name in (("running", "Running"), ("queued", "Queued"), ("failed", "Failed"), ("done", "Recently Finished")):
+        lines = [reset_jobs.describe_job(job) for job in guild_jobs if job["state"] == state]
+        if state == "done":
+            lines = lines[-5:]
+        embed.add_field(name=name, value="\n".join(lines)[:1024] or "None", inline=False)
+    
+    busy = sum(1 for job in reset_jobs.jobs.values() if job["state"] in ("queued", "running"))
+    embed.set_footer(text=f"{busy} reset(s) pending across all servers, {PROXMOX_CONCURRENCY} worker(s)")
+    
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@bot.tree.command(name="bot_stats", description="Show command latency and bot internals (Admin only)")
+@instrumented
+async def bot_stats(interaction: discord.Interaction):
+    manager = multi_manager.get_manager(interaction.guild_id)
+    
+    if interaction.user.id not in manager.admins and interaction.user.id != interaction.guild.owner_id:
+        await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
+        return
+    
+    embed = discord.Embed(title="Bot Stats", color=discord.Color.blue())
+    
+    lines = []
+    for (name, labels), histogram in sorted(metrics.histograms.items()):
+        if name != "teambot_command_seconds":
+            continue
+        command = dict(labels)["command"]
+        errors = int(metrics.counters.get(("teambot_command_errors_total", labels), 0))
+        lines.append(f"`/{command}` {histogram.count} calls, avg {histogram.total / histogram.count:.2f}s, p95 <= {histogram.quantile(0.95)}s, {errors} errors")
+    embed.add_field(name="Commands", value="\n".join(lines)[:1024] or "No commands yet", inline=False)
+    
+    lines = []
+    for name, title in (("teambot_dm_seconds", "DMs"), ("teambot_guild_write_seconds", "Disk writes"), ("teambot_vm_reset_seconds", "VM resets")):
+        histograms = [histogram for (key, _), histogram in metrics.histograms.items() if key == name]
+        count = sum(histogram.count for histogram in histograms)
+        if count:
+            lines.append(f"{title}: {count}, avg {sum(histogram.total for histogram in histograms) / count:.2f}s")
+    embed.add_field(name="Background Work", value="\n".join(lines) or "Nothing yet", inline=False)
+    
+    embed.add_field(name="Gauges", value="\n".join(
+        f"{name.removeprefix('teambot_')}{''.join(' ' + label for label in labels.values())}: {value}"
+        for name, labels, value in metrics.collect_gauges()
+    )[:1024], inline=False)
+    embed.add_field(
+        name="This Server",
+        value=f"Teams: {len(manager.teams)}\nUsers on teams: {len(manager.user_teams)}\nFree slots: {len(manager.available_team_nums)}\nQueued: {len(manager.queue)}",
+        inline=False
+    )
+    
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
 @bot.tree.command(name="save_data", description="Manually save all data (Admin only)")
+@instrumented
 async def save_data(interaction: discord.Interaction):
     manager = multi_manager.get_manager(interaction.guild_id)
     
@@ -840,8 +3236,9 @@ async def save_data(interaction: discord.Interaction):
     manager.save_settings()
     manager.save_admins()
     manager.save_teams()
+    await persistence.flush()
     
-    await interaction.followup.send("All data has been saved successfully!", ephemeral=True)
+    await followup(interaction, "All data has been saved successfully!", ephemeral=True)
 
 # Run the bot
 bot.run(token)